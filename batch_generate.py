@@ -0,0 +1,83 @@
+"""一括生成CLI（GUIなしでsrc/coreを利用）"""
+import argparse
+import os
+import sys
+
+# srcディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.core.config_manager import ConfigManager
+from src.core.model_manager import ModelManager
+from src.core.image_generator import ImageGenerator
+from src.core.batch_runner import BatchRunner
+from src.utils.http_client import configure_download_client, download_options_from_config
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="JSONL/CSVのプロンプトから画像を一括生成")
+    parser.add_argument("input", help="ジョブ定義ファイル（.jsonl または .csv）")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="画像の保存先")
+    parser.add_argument("-m", "--manifest", help="マニフェストファイル（既定: <output-dir>/manifest.jsonl）")
+    parser.add_argument("-c", "--config", default="config.json", help="設定ファイル")
+    parser.add_argument("--concurrency", type=int, help="同時実行ジョブ数（既定: max_concurrent_jobs）")
+    parser.add_argument("--rate", type=float, default=2.0, help="1秒あたりの投入数上限（0で無制限）")
+    parser.add_argument("--retries", type=int, default=3, help="失敗時の最大試行回数")
+    parser.add_argument("--no-resume", action="store_true", help="マニフェストの成功済みジョブも再実行")
+    return parser.parse_args()
+
+def main():
+    """メイン関数"""
+    args = parse_args()
+    
+    config_manager = ConfigManager(args.config)
+    api_key = os.environ.get("FAL_KEY") or config_manager.get("api_key")
+    if not api_key:
+        print("エラー: APIキーが設定されていません（config.jsonまたはFAL_KEY）")
+        sys.exit(1)
+    
+    model_manager = ModelManager()
+    configure_download_client(**download_options_from_config(config_manager))
+    image_generator = ImageGenerator(
+        args.output_dir,
+        max_in_flight=args.concurrency or config_manager.get("max_concurrent_jobs", 4),
+        poll_interval=config_manager.get("job_poll_interval", 0.5),
+        upload_cache_file=config_manager.get("upload_cache_file", "upload_cache.json"),
+        model_manager=model_manager,
+        input_options={
+            "enabled": config_manager.get("input_preprocess", True),
+            "format": config_manager.get("input_image_format", "JPEG"),
+            "quality": config_manager.get("input_image_quality", 90)
+        },
+        result_cache_max_bytes=(
+            config_manager.get("result_cache_max_mb", 1024) * 1024 * 1024
+            if config_manager.get("use_result_cache", True) else None
+        )
+    )
+    runner = BatchRunner(
+        image_generator=image_generator,
+        model_manager=model_manager,
+        config_manager=config_manager,
+        api_key=api_key,
+        output_dir=args.output_dir,
+        rate_per_second=args.rate,
+        max_retries=args.retries
+    )
+    manifest = args.manifest or os.path.join(args.output_dir, "manifest.jsonl")
+    
+    def on_progress(done, total, record):
+        status = "成功" if record["success"] else f"失敗: {record.get('error')}"
+        print(f"[{done}/{total}] {record['id']} {status}")
+    
+    try:
+        success_count, total = runner.run(args.input, manifest, resume=not args.no_resume, on_progress=on_progress)
+        print(f"結果: {success_count}/{total} 成功 (マニフェスト: {manifest})")
+    except ValueError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        image_generator.shutdown()
+    
+    if success_count < total:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
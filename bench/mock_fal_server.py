@@ -0,0 +1,271 @@
+"""fal.aiキュー・アップロードAPIのローカル代替サーバー（ベンチマーク用）"""
+import asyncio
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import fal_client
+
+def make_png(width, height, seed=0):
+    """Pillowなしで指定サイズのPNGを生成（ノイズ入りで実際の画像に近いサイズにする）"""
+    rng = random.Random(seed)
+    row = bytes(rng.getrandbits(8) for _ in range(width * 3))
+    raw = b"".join(b"\x00" + row[i % 7:] + row[:i % 7] for i in range(height))
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+class MockFalServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=(0.5, 1.5), failure_rate=0.0,
+                 image_size=(1024, 768), seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.image_size = image_size
+        self.random = random.Random(seed)
+        self.requests = {}
+        self.files = {}
+        self.stats = {"submitted": 0, "results": 0, "downloads": 0, "uploads": 0, "upload_bytes": 0}
+        self._lock = threading.Lock()
+        self.image_bytes = make_png(*image_size, seed=seed)
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """バックグラウンドスレッドで起動"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="MockFalServer", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """停止"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def create_request(self, app, arguments):
+        """キューにリクエストを登録"""
+        request_id = uuid.uuid4().hex
+        with self._lock:
+            latency = self.random.uniform(*self.latency)
+            failed = self.random.random() < self.failure_rate
+            self.requests[request_id] = {
+                "app": app,
+                "arguments": arguments,
+                "created": time.monotonic(),
+                "latency": latency,
+                "failed": failed
+            }
+            self.stats["submitted"] += 1
+        return request_id
+
+    def get_status(self, request_id):
+        """経過時間からキュー状態を算出"""
+        request = self.requests[request_id]
+        elapsed = time.monotonic() - request["created"]
+        if elapsed >= request["latency"]:
+            return "COMPLETED"
+        if elapsed >= request["latency"] * 0.2:
+            return "IN_PROGRESS"
+        return "IN_QUEUE"
+
+    def build_result(self, request_id):
+        """生成結果のJSONを作成"""
+        request = self.requests[request_id]
+        num_images = int(request["arguments"].get("num_images", 1))
+        width, height = self.image_size
+        with self._lock:
+            self.stats["results"] += 1
+        return {
+            "images": [{
+                "url": f"{self.base_url}/files/{request_id}_{i}.png",
+                "width": width,
+                "height": height,
+                "content_type": "image/png"
+            } for i in range(num_images)],
+            "seed": request["arguments"].get("seed", 0),
+            "prompt": request["arguments"].get("prompt", "")
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length) if length else b""
+
+            def do_POST(self):
+                body = self.read_body()
+                if self.path.startswith("/storage/upload"):
+                    name = f"upload_{uuid.uuid4().hex}"
+                    with server._lock:
+                        server.files[name] = (body, self.headers.get("Content-Type", "application/octet-stream"))
+                        server.stats["uploads"] += 1
+                        server.stats["upload_bytes"] += len(body)
+                    self.send_json(200, {"url": f"{server.base_url}/files/{name}"})
+                    return
+
+                match = re.match(r"^/(queue|run)/(.+)$", self.path)
+                if not match:
+                    self.send_json(404, {"detail": "not found"})
+                    return
+
+                kind, app = match.groups()
+                arguments = json.loads(body or b"{}")
+                request_id = server.create_request(app, arguments)
+                if kind == "run":
+                    # 同期実行（subscribe相当）
+                    time.sleep(server.requests[request_id]["latency"])
+                    if server.requests[request_id]["failed"]:
+                        self.send_json(500, {"detail": "mock failure"})
+                    else:
+                        self.send_json(200, server.build_result(request_id))
+                    return
+
+                base = f"{server.base_url}/queue/{app}/requests/{request_id}"
+                self.send_json(200, {
+                    "request_id": request_id,
+                    "status_url": f"{base}/status",
+                    "response_url": base
+                })
+
+            def do_GET(self):
+                if self.path.startswith("/files/"):
+                    name = self.path[len("/files/"):]
+                    with server._lock:
+                        server.stats["downloads"] += 1
+                    body, content_type = server.files.get(name, (server.image_bytes, "image/png"))
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                match = re.match(r"^/queue/.+/requests/([0-9a-f]+)(/status)?$", self.path)
+                if not match or match.group(1) not in server.requests:
+                    self.send_json(404, {"detail": "not found"})
+                    return
+
+                request_id, is_status = match.groups()
+                status = server.get_status(request_id)
+                if is_status:
+                    self.send_json(200, {"status": status})
+                elif status != "COMPLETED":
+                    self.send_json(400, {"detail": "request is still in progress"})
+                elif server.requests[request_id]["failed"]:
+                    self.send_json(500, {"detail": "mock failure"})
+                else:
+                    self.send_json(200, server.build_result(request_id))
+
+        return Handler
+
+class MockRequestHandle:
+    """fal_client.AsyncRequestHandle相当（モックサーバーに問い合わせる）"""
+    def __init__(self, client, application, request_id):
+        self.client = client
+        self.application = application
+        self.request_id = request_id
+
+    async def status(self, with_logs=False):
+        url = f"{self.client.base_url}/queue/{self.application}/requests/{self.request_id}/status"
+        data = await asyncio.to_thread(self.client.request_json, "GET", url)
+        if data["status"] == "COMPLETED":
+            return fal_client.Completed(logs=None, metrics={})
+        if data["status"] == "IN_PROGRESS":
+            return fal_client.InProgress(logs=None)
+        return fal_client.Queued(position=0)
+
+    async def get(self):
+        url = f"{self.client.base_url}/queue/{self.application}/requests/{self.request_id}"
+        return await asyncio.to_thread(self.client.request_json, "GET", url)
+
+class MockAsyncClient:
+    """fal_client.AsyncClient相当（SubmissionEngineのclient_factoryに渡す）"""
+    def __init__(self, base_url, key=None):
+        self.base_url = base_url
+        self.key = key
+        self.session = requests.Session()
+
+    def request_json(self, method, url, payload=None):
+        response = self.session.request(method, url, json=payload, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    async def submit(self, application, arguments):
+        url = f"{self.base_url}/queue/{application}"
+        data = await asyncio.to_thread(self.request_json, "POST", url, arguments)
+        return MockRequestHandle(self, application, data["request_id"])
+
+    async def get_handle(self, application, request_id):
+        return MockRequestHandle(self, application, request_id)
+
+def mock_subscribe(base_url):
+    """fal_client.subscribe の代替関数を作成（同期API利用箇所向け）"""
+    session = requests.Session()
+
+    def subscribe(application, arguments, **kwargs):
+        response = session.post(f"{base_url}/run/{application}", json=arguments, timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+    return subscribe
+
+def mock_upload(base_url):
+    """fal_client.upload の代替関数を作成"""
+    session = requests.Session()
+
+    def upload(data, content_type, file_name=None):
+        response = session.post(f"{base_url}/storage/upload", data=data,
+                                headers={"Content-Type": content_type}, timeout=60)
+        response.raise_for_status()
+        return response.json()["url"]
+
+    return upload
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="fal.aiモックサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.5, 1.5), metavar=("MIN", "MAX"))
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("W", "H"))
+    args = parser.parse_args()
+
+    server = MockFalServer(port=args.port, latency=tuple(args.latency),
+                           failure_rate=args.failure_rate, image_size=tuple(args.image_size))
+    print(f"モックサーバー起動: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""モックサーバーを使ったエンドツーエンドのベンチマーク（fal.aiへの課金なし）
+
+使用方法:
+  python bench/run_benchmarks.py [--jobs 20] [--latency 0.5 1.5] [--failure-rate 0.0] [--image-size 1024 768]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench.mock_fal_server import MockFalServer, MockAsyncClient, mock_subscribe
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def percentile(values, p):
+    """パーセンタイル値（最近傍法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def peak_rss_mb():
+    """プロセスのピークRSS（MB）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(name, latencies, images, wall_time, failures=0):
+    """計測結果をまとめる"""
+    return {
+        "benchmark": name,
+        "count": len(latencies),
+        "failures": failures,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "images_per_sec": round(images / wall_time, 2) if wall_time > 0 else None,
+        "wall_time_s": round(wall_time, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource else None
+    }
+
+def bench_generate(server, jobs, concurrency, work_dir):
+    """ImageGenerator.generate / submit のスループット"""
+    from src.core.image_generator import ImageGenerator
+
+    generator = ImageGenerator(
+        os.path.join(work_dir, "generate"),
+        max_in_flight=concurrency,
+        poll_interval=0.05,
+        client_factory=lambda api_key: MockAsyncClient(server.base_url, api_key)
+    )
+    params = generator.build_text_to_image_params(
+        prompt="benchmark", negative_prompt="", num_inference_steps=4, guidance_scale=3.5,
+        num_images=1, enable_safety_checker=True, image_size_params="landscape_4_3"
+    )
+
+    latencies = []
+    failures = 0
+    started = time.monotonic()
+
+    def run_one(_):
+        t0 = time.monotonic()
+        result = generator.generate("mock-key", "fal-ai/flux/schnell", params)
+        return time.monotonic() - t0, result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, result in executor.map(run_one, range(jobs)):
+            if result["success"]:
+                latencies.append(elapsed)
+            else:
+                failures += 1
+
+    wall_time = time.monotonic() - started
+    generator.shutdown()
+    return summarize("ImageGenerator.generate", latencies, len(latencies), wall_time, failures)
+
+def bench_save(server, jobs, concurrency, work_dir):
+    """save_image_from_url のダウンロード・保存"""
+    from src.utils.file_utils import save_image_from_url
+    from src.utils.image_cache import fetched_image_cache
+
+    fetched_image_cache.clear()
+    out_dir = os.path.join(work_dir, "save")
+    os.makedirs(out_dir, exist_ok=True)
+
+    def run_one(i):
+        t0 = time.monotonic()
+        result = save_image_from_url(f"{server.base_url}/files/save_{i}.png", os.path.join(out_dir, f"{i}.png"))
+        return time.monotonic() - t0, result
+
+    latencies = []
+    failures = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, result in executor.map(run_one, range(jobs)):
+            if result["success"]:
+                latencies.append(elapsed)
+            else:
+                failures += 1
+    return summarize("save_image_from_url", latencies, len(latencies), time.monotonic() - started, failures)
+
+def bench_display(server, jobs, work_dir):
+    """保存後のImageDisplayManager.create_image_display によるサムネイル作成"""
+    from src.ui.utils.image_utils import ImageDisplayManager
+    from src.utils.file_utils import save_image_from_url
+    from src.utils.image_cache import fetched_image_cache
+
+    fetched_image_cache.clear()
+    manager = ImageDisplayManager()
+
+    # PhotoImageの作成にはTkが必要（ディスプレイが無い環境ではサムネイル作成まで計測）
+    root = None
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+        run = manager.create_image_display
+        name = "ImageDisplayManager.create_image_display"
+    except Exception:
+        run = manager.prepare_thumbnail
+        name = "ImageDisplayManager.prepare_thumbnail (Tkなし)"
+
+    latencies = []
+    failures = 0
+    started = time.monotonic()
+    for i in range(jobs):
+        t0 = time.monotonic()
+        # 画面表示は保存済みのファイルから行う（結果処理と同じ流れ）
+        result = save_image_from_url(f"{server.base_url}/files/display_{i}.png",
+                                     os.path.join(work_dir, f"display_{i}.png"))
+        if result["success"]:
+            result = run(result["filepath"], os.path.basename(result["filepath"]))
+        if result["success"]:
+            latencies.append(time.monotonic() - t0)
+        else:
+            failures += 1
+    wall_time = time.monotonic() - started
+
+    if root is not None:
+        root.destroy()
+    return summarize(name, latencies, len(latencies), wall_time, failures)
+
+class FakeOpenAI:
+    """翻訳呼び出しの代替（入力に印を付けて返す）"""
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        content = kwargs["messages"][-1]["content"]
+        if content.startswith("以下を英語に翻訳: "):
+            text = "[en] " + content.replace("以下を英語に翻訳: ", "")
+        else:
+            # 一括翻訳: 指示文の次の行のJSON配列の各要素に印を付けて返す
+            texts = json.loads(content.split("\n", 1)[1])
+            text = json.dumps(["[en] " + t for t in texts], ensure_ascii=False)
+        message = type("Message", (), {"content": text})()
+        choice = type("Choice", (), {"message": message})()
+        return type("Response", (), {"choices": [choice]})()
+
+def bench_lyrics(server, songs, work_dir, translate_latency):
+    """LyricsImageGenerator.process_directory（翻訳・画像生成・保存）"""
+    import lyrics_image_generator
+
+    lyrics_root = os.path.join(work_dir, "lyrics")
+    config_path = os.path.join(work_dir, "lyrics_config.json")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({"api_key": "mock-key", "openai_api_key": "mock-key", "output_directory": lyrics_root,
+                   "translation_cache_file": os.path.join(work_dir, "translation_cache.db")}, f)
+
+    song = {
+        "title": "ベンチマークの歌",
+        "lyrics": {part: ["一行目の歌詞", "二行目の歌詞"] for part in
+                   ["intro", "verse1", "pre_chorus", "chorus", "verse2", "bridge", "outro"]}
+    }
+    directories = []
+    for i in range(songs):
+        song_dir = os.path.join(lyrics_root, f"user_{i}")
+        os.makedirs(song_dir, exist_ok=True)
+        for song_type in ("opening", "ending"):
+            with open(os.path.join(song_dir, f"lyrics_{song_type}_20250101_000000.json"), 'w', encoding='utf-8') as f:
+                json.dump(song, f, ensure_ascii=False)
+        directories.append(song_dir)
+
+    original_subscribe = lyrics_image_generator.fal_client.subscribe
+    lyrics_image_generator.fal_client.subscribe = mock_subscribe(server.base_url)
+    try:
+        generator = lyrics_image_generator.LyricsImageGenerator(config_path)
+        generator.openai_client = FakeOpenAI(translate_latency)
+
+        latencies = []
+        failures = 0
+        started = time.monotonic()
+        for song_dir in directories:
+            t0 = time.monotonic()
+            success, _ = generator.process_directory(song_dir)
+            if success:
+                latencies.append(time.monotonic() - t0)
+            else:
+                failures += 1
+        wall_time = time.monotonic() - started
+    finally:
+        lyrics_image_generator.fal_client.subscribe = original_subscribe
+
+    images = sum(len(os.listdir(os.path.join(d, f"{t}_image"))) for d in directories
+                 for t in ("opening", "ending") if os.path.isdir(os.path.join(d, f"{t}_image")))
+    result = summarize("LyricsImageGenerator.process_directory", latencies, images, wall_time, failures)
+    result["translation_calls"] = generator.openai_client.calls
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="モックfalサーバーでのベンチマーク")
+    parser.add_argument("--jobs", type=int, default=20, help="生成・保存のジョブ数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時実行数")
+    parser.add_argument("--songs", type=int, default=2, help="歌詞パイプラインの曲ディレクトリ数")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.5, 1.5), metavar=("MIN", "MAX"),
+                        help="モックの生成時間（秒）")
+    parser.add_argument("--translate-latency", type=float, default=0.05, help="翻訳呼び出し1回の疑似時間（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="モックの失敗率")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("W", "H"))
+    parser.add_argument("--only", nargs="*", choices=["generate", "save", "display", "lyrics"],
+                        help="実行するベンチマークを限定")
+    parser.add_argument("--json", help="結果をJSONで書き出すファイル")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    server = MockFalServer(latency=tuple(args.latency), failure_rate=args.failure_rate,
+                           image_size=tuple(args.image_size)).start()
+    selected = set(args.only or ["generate", "save", "display", "lyrics"])
+    results = []
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            if "generate" in selected:
+                results.append(bench_generate(server, args.jobs, args.concurrency, work_dir))
+            if "save" in selected:
+                results.append(bench_save(server, args.jobs, args.concurrency, work_dir))
+            if "display" in selected:
+                results.append(bench_display(server, args.jobs, work_dir))
+            if "lyrics" in selected:
+                results.append(bench_lyrics(server, args.songs, work_dir, args.translate_latency))
+    finally:
+        server.stop()
+
+    for result in results:
+        print(f"{result['benchmark']}: n={result['count']} 失敗={result['failures']} "
+              f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+              f"{result['images_per_sec']}枚/秒 ピークRSS={result['peak_rss_mb']}MB")
+    print(f"モックサーバー統計: {server.stats}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"results": results, "server": server.stats}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,10 @@ from tkinter import ttk, scrolledtext, messagebox, filedialog
 import json
 import os
 import threading
-import requests
 import fal_client
 from PIL import Image, ImageTk
 from io import BytesIO
+from src.utils.http_client import configure_download_client, download_options_from_config, get_download_client
 import webbrowser
 
 class FluxGUI:
@@ -51,6 +51,7 @@ class FluxGUI:
         
         # 設定を読み込み
         self.load_config()
+        configure_download_client(**download_options_from_config(self.config))
         
         # UIを作成
         self.create_ui()
@@ -410,8 +411,7 @@ class FluxGUI:
             saved_files = []
             
             for i, image_data in enumerate(result['images']):
-                response = requests.get(image_data['url'])
-                image = Image.open(BytesIO(response.content))
+                image = Image.open(BytesIO(get_download_client().get(image_data['url'])))
                 
                 # 自動保存
                 import datetime
@@ -1,8 +1,8 @@
 import os
-import requests
 import fal_client
 from PIL import Image
 from io import BytesIO
+from src.utils.http_client import get_download_client
 
 # APIキーを設定（環境変数または直接設定）
 os.environ["FAL_KEY"] = "b488e96d-07f9-4819-ad46-1fa63085406c:94fa3a45388437253fd0e273105e8161"  # ここにあなたのAPIキーを入力
@@ -38,8 +38,7 @@ def generate_image(prompt, width=1024, height=1024, num_images=1, guidance_scale
             image_url = image_data['url']
             
             # 画像をダウンロード
-            response = requests.get(image_url)
-            image = Image.open(BytesIO(response.content))
+            image = Image.open(BytesIO(get_download_client().get(image_url)))
             
             # ファイル名を生成
             filename = f"flux_generated_{i+1}.png"
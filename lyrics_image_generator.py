@@ -1,21 +1,56 @@
 # lyrics_image_generator.py
 import json
+import multiprocessing
 import os
 import re
 import fal_client
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
+from src.core.lyrics_index import LyricsIndex, scan_lyrics_directory
+from src.core.lyrics_manifest import LyricsManifest
+from src.core.translation_cache import TranslationCache
+from src.utils.http_client import configure_download_client, download_options_from_config, get_download_client
+from src.utils.rate_limiter import RateLimiter, SharedRateLimiter
 
 class LyricsImageGenerator:
-    def __init__(self, config_path: str = "config.json"):
-        self.config = self.load_config(config_path)
+    def __init__(self, config_path: str = "config.json", config: Optional[Dict[str, Any]] = None):
+        self.config_path = config_path
+        self.config = config if config is not None else self.load_config(config_path)
         
         # API設定
         fal_client.api_key = self.config["api_key"]
         from openai import OpenAI
         self.openai_client = OpenAI(api_key=self.config["openai_api_key"])
         
+        # APIのレート制限（ワーカープロセス並列時は全プロセス共有のものに差し替え、0以下は無制限）
+        self.fal_limiter = RateLimiter(self.config.get("fal_rate_per_second", 0))
+        self.openai_limiter = RateLimiter(self.config.get("openai_rate_per_second", 0))
+        
+        # 翻訳設定（キャッシュのキーにも使用）
+        self.translation_model = self.config.get("translation_model", "gpt-4")
+        self.translation_temperature = self.config.get("translation_temperature", 0.3)
+        self.translation_cache = None
+        if self.config.get("use_translation_cache", True):
+            self.translation_cache = TranslationCache(self.config.get("translation_cache_file", "translation_cache.db"))
+        
+        # 処理済みディレクトリのマニフェスト（差分処理用）
+        output_directory = self.config.get("output_directory", ".")
+        self.manifest = LyricsManifest(
+            self.config.get("lyrics_manifest_file", os.path.join(output_directory, "lyrics_manifest.json")),
+            output_directory
+        )
+        # 歌詞ファイルの探索（use_lyrics_index が有効ならディレクトリ単位の結果を永続化）
+        self.lyrics_index = LyricsIndex(
+            self.config.get("lyrics_index_file", os.path.join(output_directory, "lyrics_index.json"))
+            if self.config.get("use_lyrics_index", False) else None
+        )
+        
+        # Noneでなければマニフェストへの記録をここに溜める（ワーカープロセスから親へ返す用）
+        self.manifest_updates = None
+        self.last_report = {"processed": [], "skipped": [], "failed": [], "resumed": []}
+        
         # 歌詞パート
         self.lyrics_parts = ["intro", "verse1", "pre_chorus", "chorus", "verse2", "bridge", "outro"]
         
@@ -32,19 +67,10 @@ class LyricsImageGenerator:
     
     def find_latest_lyrics_files(self, lyrics_dir: str) -> Tuple[Optional[str], Optional[str]]:
         """最新のオープニングとエンディングファイルを検索"""
-        opening_files = []
-        ending_files = []
-        
-        for filename in os.listdir(lyrics_dir):
-            file_path = os.path.join(lyrics_dir, filename)
-            if filename.startswith("lyrics_opening_") and filename.endswith(".json"):
-                opening_files.append((os.path.getctime(file_path), file_path))
-            elif filename.startswith("lyrics_ending_") and filename.endswith(".json"):
-                ending_files.append((os.path.getctime(file_path), file_path))
-        
-        # 最新ファイルを取得
-        latest_opening = sorted(opening_files, reverse=True)[0][1] if opening_files else None
-        latest_ending = sorted(ending_files, reverse=True)[0][1] if ending_files else None
+        # 1回の走査で種別ごとの最新ファイルだけを保持
+        latest, _ = scan_lyrics_directory(lyrics_dir)
+        latest_opening = os.path.join(lyrics_dir, latest["opening"][1]) if latest["opening"] else None
+        latest_ending = os.path.join(lyrics_dir, latest["ending"][1]) if latest["ending"] else None
         
         if latest_opening:
             self.DEBUGLOG(f"最新オープニング: {os.path.basename(latest_opening)}")
@@ -56,24 +82,145 @@ class LyricsImageGenerator:
     def translate_to_english(self, text: str) -> str:
         """テキストを英語に翻訳"""
         try:
+            self.openai_limiter.acquire()
             response = self.openai_client.chat.completions.create(
-                model="gpt-4",
+                model=self.translation_model,
                 messages=[
                     {"role": "system", "content": "日本語の歌詞を自然で美しい英語に翻訳してください。"},
                     {"role": "user", "content": f"以下を英語に翻訳: {text}"}
                 ],
                 max_tokens=500,
-                temperature=0.3
+                temperature=self.translation_temperature
             )
             return response.choices[0].message.content.strip()
         except Exception as e:
             self.DEBUGLOG(f"翻訳エラー: {e}", "ERROR")
             return text
     
-    def translate_lyrics_json(self, lyrics_data: Dict[str, Any]) -> Dict[str, Any]:
-        """歌詞JSON全体を英語化"""
+    def translate_texts_batch(self, texts: List[str]) -> Optional[List[str]]:
+        """複数テキストを1回のリクエストで翻訳 - 戻り値: 入力と同じ順序の翻訳リスト（解析失敗時はNone）"""
+        try:
+            self.openai_limiter.acquire()
+            response = self.openai_client.chat.completions.create(
+                model=self.translation_model,
+                messages=[
+                    {"role": "system", "content": "日本語の歌詞を自然で美しい英語に翻訳してください。"},
+                    {"role": "user", "content": "以下のJSON配列の各要素を英語に翻訳し、同じ順序・同じ要素数のJSON配列のみを返してください:\n"
+                                                + json.dumps(texts, ensure_ascii=False)}
+                ],
+                max_tokens=self.config.get("translation_batch_max_tokens", 4000),
+                temperature=self.translation_temperature
+            )
+            content = response.choices[0].message.content.strip()
+            
+            # コードブロック等で囲まれていても配列部分だけを取り出す
+            start, end = content.find("["), content.rfind("]")
+            if start < 0 or end < start:
+                raise ValueError("JSON配列が見つからない")
+            translations = json.loads(content[start:end + 1])
+            
+            if (not isinstance(translations, list) or len(translations) != len(texts)
+                    or not all(isinstance(t, str) for t in translations)):
+                raise ValueError(f"要素数が一致しない: {len(texts)}件中{len(translations) if isinstance(translations, list) else 0}件")
+            return [t.strip() for t in translations]
+        except Exception as e:
+            self.DEBUGLOG(f"一括翻訳エラー（1行ずつの翻訳に切替）: {e}", "WARNING")
+            return None
+    
+    def translate_texts(self, texts: List[str]) -> List[str]:
+        """テキストのリストを翻訳（一括翻訳が有効ならまとめて送信、失敗時は1行ずつ）"""
+        # 同じ行（サビの繰り返し等）は1回だけ翻訳
+        unique_texts = list(dict.fromkeys(t for t in texts if t))
+        
+        # 翻訳済みのテキストはキャッシュから取得
+        translated = {}
+        if self.translation_cache is not None and unique_texts:
+            translated = self.translation_cache.get_many(unique_texts, self.translation_model, self.translation_temperature)
+        pending = [text for text in unique_texts if text not in translated]
+        
+        if self.config.get("batch_translation", True):
+            batch_size = max(1, self.config.get("translation_batch_size", 100))
+            for i in range(0, len(pending), batch_size):
+                chunk = pending[i:i + batch_size]
+                results = self.translate_texts_batch(chunk)
+                if results is not None:
+                    translated.update(zip(chunk, results))
+                    self.store_translations(dict(zip(chunk, results)))
+        
+        for text in pending:
+            if text not in translated:
+                translated[text] = self.translate_to_english(text)
+                self.store_translations({text: translated[text]})
+        
+        return [translated.get(text, text) for text in texts]
+    
+    def store_translations(self, translations: Dict[str, str]):
+        """翻訳結果をキャッシュに登録（翻訳エラーで原文のまま返ったものは除外）"""
+        if self.translation_cache is None:
+            return
+        valid = {source: result for source, result in translations.items() if result and result != source}
+        try:
+            self.translation_cache.put_many(valid, self.translation_model, self.translation_temperature)
+        except Exception as e:
+            self.DEBUGLOG(f"翻訳キャッシュ保存エラー: {e}", "WARNING")
+    
+    def prewarm_translation_cache(self, base_dir: Optional[str] = None) -> int:
+        """既存の en_lyrics_*.json と元の歌詞JSONを対応付けてキャッシュに登録 - 戻り値: 登録件数"""
+        if self.translation_cache is None:
+            return 0
+        
+        base_dir = base_dir or self.config["output_directory"]
+        count = 0
+        for root, dirs, files in os.walk(base_dir):
+            for song_type in ("opening", "ending"):
+                sources = [os.path.join(root, f) for f in files
+                           if f.startswith(f"lyrics_{song_type}_") and f.endswith(".json")]
+                outputs = [os.path.join(root, f) for f in files
+                           if f.startswith(f"en_lyrics_{song_type}_") and f.endswith(".json")]
+                if not sources or not outputs:
+                    continue
+                
+                sources.sort(key=os.path.getmtime)
+                for output_file in outputs:
+                    # 英語版の作成時点で最新だった元ファイルを翻訳元とみなす
+                    output_mtime = os.path.getmtime(output_file)
+                    candidates = [f for f in sources if os.path.getmtime(f) <= output_mtime] or sources
+                    try:
+                        with open(candidates[-1], 'r', encoding='utf-8') as f:
+                            source_texts = self.collect_texts(json.load(f))
+                        with open(output_file, 'r', encoding='utf-8') as f:
+                            english_texts = self.collect_texts(json.load(f))
+                    except Exception as e:
+                        self.DEBUGLOG(f"キャッシュ事前登録スキップ: {output_file}: {e}", "WARNING")
+                        continue
+                    
+                    # 構造が一致しない組み合わせは対応付けない
+                    if len(source_texts) != len(english_texts):
+                        continue
+                    pairs = {s: e for s, e in zip(source_texts, english_texts) if s and isinstance(s, str) and isinstance(e, str)}
+                    self.store_translations(pairs)
+                    count += len(pairs)
+        
+        self.DEBUGLOG(f"翻訳キャッシュ事前登録: {count}件")
+        return count
+    
+    def collect_texts(self, lyrics_data: Dict[str, Any]) -> List[str]:
+        """歌詞JSONから翻訳対象のテキストを順番に取り出す（タイトル、各パートの行）"""
+        texts = [lyrics_data.get("title", "")]
+        for part in self.lyrics_parts:
+            if part in lyrics_data.get("lyrics", {}):
+                lyrics_lines = lyrics_data["lyrics"][part]
+                if isinstance(lyrics_lines, list):
+                    texts.extend(lyrics_lines)
+                else:
+                    texts.append(lyrics_lines)
+        return texts
+    
+    def apply_translations(self, lyrics_data: Dict[str, Any], translations: List[str]) -> Dict[str, Any]:
+        """collect_textsと同じ順序の翻訳結果から英語版JSONを組み立て"""
+        iterator = iter(translations)
         english_lyrics = {
-            "title": self.translate_to_english(lyrics_data.get("title", "")),
+            "title": next(iterator),
             "lyrics": {}
         }
         
@@ -81,12 +228,28 @@ class LyricsImageGenerator:
             if part in lyrics_data.get("lyrics", {}):
                 lyrics_lines = lyrics_data["lyrics"][part]
                 if isinstance(lyrics_lines, list):
-                    english_lyrics["lyrics"][part] = [self.translate_to_english(line) for line in lyrics_lines]
+                    english_lyrics["lyrics"][part] = [next(iterator) for _ in lyrics_lines]
                 else:
-                    english_lyrics["lyrics"][part] = self.translate_to_english(lyrics_lines)
+                    english_lyrics["lyrics"][part] = next(iterator)
         
         return english_lyrics
     
+    def translate_lyrics_batch(self, lyrics_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """複数曲の歌詞JSONをまとめて英語化"""
+        texts_per_song = [self.collect_texts(lyrics_data) for lyrics_data in lyrics_list]
+        translations = self.translate_texts([text for texts in texts_per_song for text in texts])
+        
+        english_list = []
+        offset = 0
+        for lyrics_data, texts in zip(lyrics_list, texts_per_song):
+            english_list.append(self.apply_translations(lyrics_data, translations[offset:offset + len(texts)]))
+            offset += len(texts)
+        return english_list
+    
+    def translate_lyrics_json(self, lyrics_data: Dict[str, Any]) -> Dict[str, Any]:
+        """歌詞JSON全体を英語化"""
+        return self.translate_lyrics_batch([lyrics_data])[0]
+    
     def create_image_prompt(self, lyrics_lines: List[str], title: str, part_name: str) -> str:
         """歌詞から画像プロンプト生成"""
         lyrics_text = " ".join(lyrics_lines) if isinstance(lyrics_lines, list) else lyrics_lines
@@ -95,6 +258,7 @@ class LyricsImageGenerator:
     def generate_image(self, prompt: str, filename: str) -> Optional[str]:
         """fal AIで画像生成"""
         try:
+            self.fal_limiter.acquire()
             result = fal_client.subscribe(
                 "fal-ai/flux/schnell",
                 arguments={
@@ -121,63 +285,79 @@ class LyricsImageGenerator:
     
     def download_image(self, image_url: str, file_path: str) -> bool:
         """画像ダウンロード"""
+        temp_path = f"{file_path}.part"
         try:
-            response = requests.get(image_url)
-            response.raise_for_status()
-            
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            # 並列実行中に書きかけのファイルが残らないよう一時ファイル経由で保存
+            with get_download_client().stream(image_url) as (_, chunks):
+                with open(temp_path, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+            os.replace(temp_path, file_path)
             
             self.DEBUGLOG(f"画像保存: {file_path}")
             return True
             
         except Exception as e:
             self.DEBUGLOG(f"ダウンロードエラー: {e}", "ERROR")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             return False
     
-    def process_lyrics_file(self, file_path: str, song_type: str, base_dir: str) -> Tuple[bool, Optional[str]]:
-        """歌詞ファイル処理 - 戻り値: (成功/失敗, 画像フォルダパス)"""
-        try:
-            # 歌詞読み込み
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lyrics_data = json.load(f)
-            
-            self.DEBUGLOG(f"{song_type} 処理開始: {os.path.basename(file_path)}")
-            
-            # 英語化
-            english_lyrics = self.translate_lyrics_json(lyrics_data)
-            
-            # 英語版JSON保存
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            english_file = os.path.join(base_dir, f"en_lyrics_{song_type}_{timestamp}.json")
-            
-            with open(english_file, 'w', encoding='utf-8') as f:
-                json.dump(english_lyrics, f, ensure_ascii=False, indent=2)
-            
-            self.DEBUGLOG(f"英語版保存: {os.path.basename(english_file)}")
-            
-            # 画像ディレクトリ作成
-            image_dir = os.path.join(base_dir, f"{song_type}_image")
-            os.makedirs(image_dir, exist_ok=True)
-            
-            # 各パート画像生成
-            title = english_lyrics.get("title", "Untitled")
-            lyrics = english_lyrics.get("lyrics", {})
-            
-            for part in self.lyrics_parts:
-                if part in lyrics:
-                    prompt = self.create_image_prompt(lyrics[part], title, part)
-                    image_url = self.generate_image(prompt, f"{song_type}_{part}")
-                    
-                    if image_url:
-                        image_path = os.path.join(image_dir, f"{part}.png")
-                        self.download_image(image_url, image_path)
-            
-            return True, image_dir
-            
-        except Exception as e:
-            self.DEBUGLOG(f"ファイル処理エラー: {e}", "ERROR")
-            return False, None
+    def build_part_tasks(self, english_lyrics: Dict[str, Any], song_type: str, base_dir: str) -> Tuple[str, List[Dict[str, str]]]:
+        """英語版JSONを保存し、パートごとの画像生成タスクを作成"""
+        # 英語版JSON保存
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        english_file = os.path.join(base_dir, f"en_lyrics_{song_type}_{timestamp}.json")
+        
+        with open(english_file, 'w', encoding='utf-8') as f:
+            json.dump(english_lyrics, f, ensure_ascii=False, indent=2)
+        
+        self.DEBUGLOG(f"英語版保存: {os.path.basename(english_file)}")
+        
+        # 画像ディレクトリ作成
+        image_dir = os.path.join(base_dir, f"{song_type}_image")
+        os.makedirs(image_dir, exist_ok=True)
+        
+        # 各パートのプロンプト作成
+        title = english_lyrics.get("title", "Untitled")
+        lyrics = english_lyrics.get("lyrics", {})
+        
+        tasks = []
+        for part in self.lyrics_parts:
+            if part in lyrics:
+                tasks.append({
+                    "name": f"{song_type}_{part}",
+                    "prompt": self.create_image_prompt(lyrics[part], title, part),
+                    "image_path": os.path.join(image_dir, f"{part}.png")
+                })
+        
+        return image_dir, tasks
+    
+    def generate_part_image(self, task: Dict[str, str]) -> bool:
+        """1パート分の画像生成・保存（失敗時は再試行）"""
+        retries = self.config.get("part_retries", 2)
+        for attempt in range(retries + 1):
+            image_url = self.generate_image(task["prompt"], task["name"])
+            if image_url and self.download_image(image_url, task["image_path"]):
+                return True
+            if attempt < retries:
+                self.DEBUGLOG(f"再試行 ({attempt + 1}/{retries}): {task['name']}", "WARNING")
+                time.sleep(self.config.get("part_retry_delay", 2) * (2 ** attempt))
+        return False
+    
+    def generate_part_images(self, tasks: List[Dict[str, str]]) -> List[bool]:
+        """全パートの画像を並列生成 - 戻り値: タスク順の成功/失敗リスト"""
+        if not tasks:
+            return []
+        
+        max_workers = self.config.get("max_parallel_parts", 7) if self.config.get("parallel_parts", True) else 1
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = list(executor.map(self.generate_part_image, tasks))
+        
+        for task, success in zip(tasks, results):
+            if not success:
+                self.DEBUGLOG(f"パート画像生成失敗: {task['name']}", "ERROR")
+        return results
     
     def process_directory(self, lyrics_dir: str) -> Tuple[bool, List[str]]:
         """ディレクトリ処理 - 戻り値: (成功/失敗, 作成された画像フォルダパスのリスト)"""
@@ -189,64 +369,275 @@ class LyricsImageGenerator:
                 self.DEBUGLOG(f"ファイルが見つからない: {lyrics_dir}", "WARNING")
                 return False, []
             
-            # 各ファイル処理
+            # オープニング・エンディングを1回のリクエストでまとめて英語化
+            songs = []
+            for song_type, file_path in [("opening", opening_file), ("ending", ending_file)]:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    songs.append((song_type, json.load(f)))
+                self.DEBUGLOG(f"{song_type} 処理開始: {os.path.basename(file_path)}")
+            
+            english_list = self.translate_lyrics_batch([lyrics_data for _, lyrics_data in songs])
+            
             created_folders = []
+            all_tasks = []
             success = True
             
-            for song_type, file_path in [("opening", opening_file), ("ending", ending_file)]:
-                file_success, image_folder = self.process_lyrics_file(file_path, song_type, lyrics_dir)
-                if file_success and image_folder:
+            for (song_type, _), english_lyrics in zip(songs, english_list):
+                try:
+                    image_folder, tasks = self.build_part_tasks(english_lyrics, song_type, lyrics_dir)
                     created_folders.append(image_folder)
-                else:
+                    all_tasks.extend(tasks)
+                except Exception as e:
+                    self.DEBUGLOG(f"ファイル処理エラー: {e}", "ERROR")
                     success = False
             
+            # オープニング・エンディングの全パートをまとめて並列生成
+            results = self.generate_part_images(all_tasks)
+            
+            # 失敗したパートがあればディレクトリ全体を失敗扱い（チェックポイントに残さず再実行させる）
+            failed_parts = sum(1 for result in results if not result)
+            if failed_parts:
+                self.DEBUGLOG(f"パート画像の生成失敗: {failed_parts}/{len(results)}件 ({lyrics_dir})", "ERROR")
+                success = False
+            
+            # 全パートが揃った場合のみマニフェストに記録（次回の差分処理でスキップ）
+            if success:
+                try:
+                    update = (
+                        lyrics_dir,
+                        self.manifest.describe_sources(lyrics_dir, {"opening": opening_file, "ending": ending_file}),
+                        [os.path.relpath(task["image_path"], lyrics_dir) for task in all_tasks]
+                    )
+                    if self.manifest_updates is not None:
+                        self.manifest_updates.append(update)
+                    else:
+                        self.manifest.record(*update)
+                except Exception as e:
+                    self.DEBUGLOG(f"マニフェスト保存エラー: {e}", "WARNING")
+            
             return success, created_folders
             
         except Exception as e:
             self.DEBUGLOG(f"ディレクトリエラー: {e}", "ERROR")
             return False, []
     
-    def process_all_directories(self) -> Tuple[bool, List[str]]:
+    def is_directory_up_to_date(self, lyrics_dir: str, opening_file: Optional[str] = None,
+                                ending_file: Optional[str] = None) -> bool:
+        """最新の歌詞ファイルが前回処理時から変わっておらず、画像が揃っていればTrue"""
+        if not opening_file or not ending_file:
+            opening_file, ending_file = self.find_latest_lyrics_files(lyrics_dir)
+        if not opening_file or not ending_file:
+            return False
+        
+        sources = self.manifest.describe_sources(lyrics_dir, {"opening": opening_file, "ending": ending_file})
+        return self.manifest.is_up_to_date(lyrics_dir, sources)
+    
+    def discover_directories(self, base_dir: str) -> List[Tuple[str, str, str]]:
+        """オープニングとエンディングの歌詞ファイルが揃っているディレクトリを列挙 - 戻り値: [(ディレクトリ, 最新オープニング, 最新エンディング)]"""
+        return self.lyrics_index.find_directories(base_dir)
+    
+    def get_checkpoint_file(self) -> str:
+        """中断再開用チェックポイントファイルのパス"""
+        return self.config.get("checkpoint_file",
+                               os.path.join(self.config.get("output_directory", "."), "lyrics_checkpoint.jsonl"))
+    
+    def load_checkpoint(self) -> set:
+        """前回中断時に処理済みだったディレクトリを取得"""
+        completed = set()
+        try:
+            with open(self.get_checkpoint_file(), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("success"):
+                        completed.add(record["dir"])
+        except FileNotFoundError:
+            pass
+        return completed
+    
+    def write_checkpoint(self, lyrics_dir: str, success: bool):
+        """チェックポイントに1行追記"""
+        record = {"dir": os.path.abspath(lyrics_dir), "success": success, "timestamp": datetime.now().isoformat()}
+        with open(self.get_checkpoint_file(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def run_worker_pool(self, directories: List[str], workers: int):
+        """ディレクトリを複数プロセスに振り分けて処理 - (ディレクトリ, 成功/失敗, 画像フォルダ) を完了順に返す"""
+        context = multiprocessing.get_context("spawn")
+        # 全ワーカーで共有するレート制限
+        fal_limiter = SharedRateLimiter(self.config.get("fal_rate_per_second", 0), context=context)
+        openai_limiter = SharedRateLimiter(self.config.get("openai_rate_per_second", 0), context=context)
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_lyrics_worker,
+                                 initargs=(self.config_path, self.config, fal_limiter, openai_limiter)) as executor:
+            futures = {executor.submit(process_directory_in_worker, d): d for d in directories}
+            for future in as_completed(futures):
+                lyrics_dir = futures[future]
+                try:
+                    _, dir_success, created_folders, manifest_updates = future.result()
+                except Exception as e:
+                    self.DEBUGLOG(f"ワーカーエラー ({lyrics_dir}): {e}", "ERROR")
+                    yield lyrics_dir, False, []
+                    continue
+                
+                # マニフェストは親プロセスだけが書き込む
+                for update in manifest_updates:
+                    try:
+                        self.manifest.record(*update)
+                    except Exception as e:
+                        self.DEBUGLOG(f"マニフェスト保存エラー: {e}", "WARNING")
+                yield lyrics_dir, dir_success, created_folders
+    
+    def process_all_directories(self, incremental: Optional[bool] = None, workers: Optional[int] = None,
+                                on_progress=None) -> Tuple[bool, List[str]]:
         """全ディレクトリ処理 - 戻り値: (成功/失敗, 作成された全画像フォルダパスのリスト)"""
         base_dir = self.config["output_directory"]
+        if incremental is None:
+            incremental = self.config.get("incremental", False)
+        if workers is None:
+            workers = self.config.get("workers", 1)
+        
         success_count = 0
-        total_count = 0
         all_created_folders = []
+        self.last_report = {"processed": [], "skipped": [], "failed": [], "resumed": []}
         
-        for root, dirs, files in os.walk(base_dir):
-            has_opening = any(f.startswith("lyrics_opening_") and f.endswith(".json") for f in files)
-            has_ending = any(f.startswith("lyrics_ending_") and f.endswith(".json") for f in files)
+        # 前回中断した実行の処理済み分は再開時にスキップ
+        checkpoint = self.load_checkpoint()
+        pending = []
+        for root, opening_file, ending_file in self.discover_directories(base_dir):
+            if os.path.abspath(root) in checkpoint:
+                self.last_report["resumed"].append(root)
+            # 差分処理: 変更のないディレクトリはスキップ
+            elif incremental and self.is_directory_up_to_date(root, opening_file, ending_file):
+                self.last_report["skipped"].append(root)
+                self.DEBUGLOG(f"変更なしのためスキップ: {root}")
+            else:
+                pending.append(root)
+        
+        total_count = len(pending)
+        started = time.monotonic()
+        
+        if workers > 1 and total_count > 1:
+            results = self.run_worker_pool(pending, min(workers, total_count))
+        else:
+            results = ((root, *self.process_directory(root)) for root in pending)
+        
+        for done_count, (root, dir_success, created_folders) in enumerate(results, 1):
+            self.write_checkpoint(root, dir_success)
+            if dir_success:
+                success_count += 1
+                all_created_folders.extend(created_folders)
+                self.last_report["processed"].append(root)
+                self.DEBUGLOG(f"処理完了: {root}")
+            else:
+                self.last_report["failed"].append(root)
+                self.DEBUGLOG(f"処理失敗: {root}", "ERROR")
             
-            if has_opening and has_ending:
-                total_count += 1
-                self.DEBUGLOG(f"処理開始: {root}")
-                
-                dir_success, created_folders = self.process_directory(root)
-                if dir_success:
-                    success_count += 1
-                    all_created_folders.extend(created_folders)
-                    self.DEBUGLOG(f"処理完了: {root}")
-                else:
-                    self.DEBUGLOG(f"処理失敗: {root}", "ERROR")
+            if on_progress:
+                on_progress({
+                    "done": done_count,
+                    "total": total_count,
+                    "success": success_count,
+                    "failed": done_count - success_count,
+                    "elapsed": time.monotonic() - started,
+                    "dir": root
+                })
+        
+        # 最後まで処理できたらチェックポイントは不要
+        checkpoint_file = self.get_checkpoint_file()
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
         
-        self.DEBUGLOG(f"結果: {success_count}/{total_count} 成功")
-        overall_success = success_count > 0
+        self.DEBUGLOG(f"結果: {success_count}/{total_count} 成功, スキップ: {len(self.last_report['skipped'])}, "
+                      f"再開スキップ: {len(self.last_report['resumed'])}")
+        if self.translation_cache is not None:
+            self.DEBUGLOG(f"翻訳キャッシュ: {self.translation_cache.get_stats()}")
+        # 差分処理・再開で全件スキップされた場合も成功扱い
+        skipped = self.last_report["skipped"] or self.last_report["resumed"]
+        overall_success = success_count > 0 or (total_count == 0 and bool(skipped))
         
         return overall_success, all_created_folders
 
+# ワーカープロセスごとの生成器（init_lyrics_worker で作成）
+worker_generator = None
+
+def init_lyrics_worker(config_path: str, config: Dict[str, Any], fal_limiter, openai_limiter):
+    """ワーカープロセスの初期化"""
+    global worker_generator
+    worker_generator = LyricsImageGenerator(config_path, config=config)
+    # ダウンロード用クライアントはプロセスごとに1回だけ設定
+    configure_download_client(**download_options_from_config(config))
+    worker_generator.fal_limiter = fal_limiter
+    worker_generator.openai_limiter = openai_limiter
+    worker_generator.manifest_updates = []
+
+def process_directory_in_worker(lyrics_dir: str):
+    """ワーカープロセスで1ディレクトリを処理 - 戻り値: (ディレクトリ, 成功/失敗, 画像フォルダ, マニフェスト更新)"""
+    worker_generator.manifest_updates = []
+    success, created_folders = worker_generator.process_directory(lyrics_dir)
+    return lyrics_dir, success, created_folders, worker_generator.manifest_updates
+
 def main():
     import sys
     
-    if len(sys.argv) < 2:
+    # --sequential: パート画像を1枚ずつ生成（並列化を無効化）
+    # --prewarm-cache: 既存の英語版JSONから翻訳キャッシュを事前登録
+    # --incremental: 前回から変更のないディレクトリをスキップ（--all 用）
+    # --workers N: N個のプロセスでディレクトリを並列処理（--all 用）
+    # --use-index: 歌詞ファイルの探索結果を永続化して次回以降の起動を高速化（--all 用）
+    options = {"--sequential", "--prewarm-cache", "--incremental", "--use-index"}
+    sequential = "--sequential" in sys.argv
+    incremental = "--incremental" in sys.argv
+    prewarm = "--prewarm-cache" in sys.argv
+    workers = None
+    args = []
+    argv = iter(sys.argv[1:])
+    for arg in argv:
+        if arg == "--workers":
+            workers = int(next(argv, "1"))
+        elif arg not in options:
+            args.append(arg)
+    
+    if len(args) < 1:
         print("使用方法:")
         print("  python lyrics_image_generator.py <directory>  # 特定ディレクトリ")
         print("  python lyrics_image_generator.py --all        # 全ディレクトリ")
+        print("  オプション: --sequential     パート画像を並列生成しない")
+        print("              --prewarm-cache  既存の英語版JSONから翻訳キャッシュを作成")
+        print("              --incremental    変更のないディレクトリをスキップ（--all 用）")
+        print("              --use-index      探索結果を保存し、変更のないディレクトリは再走査しない")
+        print("              --workers N      N個のプロセスで並列処理（--all 用、中断時は次回続きから再開）")
         return
     
     generator = LyricsImageGenerator()
+    configure_download_client(**download_options_from_config(generator.config))
+    if "--use-index" in sys.argv:
+        output_directory = generator.config.get("output_directory", ".")
+        generator.lyrics_index = LyricsIndex(
+            generator.config.get("lyrics_index_file", os.path.join(output_directory, "lyrics_index.json"))
+        )
+    if sequential:
+        generator.config["parallel_parts"] = False
+    if prewarm:
+        generator.prewarm_translation_cache(args[0] if args[0] != "--all" else None)
     
-    if sys.argv[1] == "--all":
-        success, created_folders = generator.process_all_directories()
+    if args[0] == "--all":
+        def print_progress(progress):
+            remaining = progress["elapsed"] / progress["done"] * (progress["total"] - progress["done"])
+            print(f"進捗: {progress['done']}/{progress['total']} (成功 {progress['success']}, 失敗 {progress['failed']}) "
+                  f"経過 {progress['elapsed']:.0f}秒 残り約 {remaining:.0f}秒")
+        
+        success, created_folders = generator.process_all_directories(
+            incremental=incremental or None, workers=workers, on_progress=print_progress
+        )
+        if generator.last_report["resumed"]:
+            print(f"前回の続きから再開（処理済みをスキップ）: {len(generator.last_report['resumed'])}件")
+        if incremental:
+            print(f"スキップ（変更なし）: {len(generator.last_report['skipped'])}件")
+            for folder in generator.last_report["skipped"]:
+                print(f"  {folder}")
         if success:
             print("全処理完了")
             print("作成されたフォルダ:")
@@ -255,7 +646,7 @@ def main():
         else:
             print("処理失敗")
     else:
-        lyrics_dir = sys.argv[1]
+        lyrics_dir = args[0]
         if not os.path.exists(lyrics_dir):
             print(f"ディレクトリが見つかりません: {lyrics_dir}")
             return
@@ -2,15 +2,83 @@ import sqlite3
 import json
 import os
 import re
+import threading
+import time
 import openai
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, List, Callable
+
+class SectionExtractor:
+    """ストリーミング中のJSON応答から、最上位キーのオブジェクト値が閉じた時点で取り出す"""
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.current_key = None
+        self.value_start = None
+    
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """受信したテキストを追加 - 戻り値: 新たに閉じた (キー, 値) のリスト"""
+        self.buffer += text
+        sections = []
+        
+        while self.position < len(self.buffer):
+            i = self.position
+            char = self.buffer[i]
+            self.position += 1
+            
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    # 最上位オブジェクト直下の文字列はキー候補
+                    if self.depth == 1 and self.value_start is None:
+                        self.current_key = json.loads(self.buffer[self.string_start:i + 1])
+                continue
+            
+            if char == '"':
+                self.in_string = True
+                self.string_start = i
+            elif char in "{[":
+                # 最上位の値のオブジェクト・配列が始まった位置を記録
+                if self.depth == 1 and self.current_key is not None:
+                    self.value_start = i
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start is not None:
+                    try:
+                        sections.append((self.current_key, json.loads(self.buffer[self.value_start:i + 1])))
+                    except json.JSONDecodeError:
+                        pass
+                    self.value_start = None
+                    self.current_key = None
+            elif char == "," and self.depth == 1:
+                self.current_key = None
+        
+        return sections
 
 class LyricsGenerator:
     def __init__(self, config_path: str = "config.json"):
         self.config = self.load_config(config_path)
         self.config_path = config_path
         
+        # 接続プールを使い回すため、OpenAIクライアントは1つだけ作成（スレッド間で共有可能）
+        from openai import OpenAI
+        self.openai_client = OpenAI(api_key=self.config["openai_api_key"])
+        
+        # 読み取り専用の接続を使い回す（get_connectionで作成）
+        self.db_conn = None
+        self.db_lock = threading.Lock()
+        
     
     def DEBUGLOG(self, message: str, level: str = "INFO"):
         """統一デバッグログ関数"""
@@ -55,48 +123,111 @@ class LyricsGenerator:
         self.config = current_config
         self.DEBUGLOG(f"設定を保存しました: {list(new_config.keys())}")
     
-    def get_user_data(self, user_id: str) -> Optional[Tuple[str, str, str, str, Dict[str, Any]]]:
-        """データベースからuser_idの最新データを取得"""
+    def get_connection(self) -> sqlite3.Connection:
+        """読み取り専用の接続を取得（初回のみ作成、以降は使い回す）"""
+        if self.db_conn is None:
+            # 読み取り専用で開き、書き込み中のプロセス（WALモード）をブロックしない
+            self.db_conn = sqlite3.connect(
+                Path(self.config['database_path']).resolve().as_uri() + "?mode=ro", uri=True,
+                timeout=30, check_same_thread=False
+            )
+            self.db_conn.row_factory = sqlite3.Row
+            self.db_conn.execute("PRAGMA query_only = ON")
+            self.db_conn.execute("PRAGMA busy_timeout = 30000")
+            self.db_conn.execute("PRAGMA cache_size = -16000")
+        return self.db_conn
+    
+    def close(self):
+        """データベース接続を閉じる"""
+        with self.db_lock:
+            if self.db_conn is not None:
+                self.db_conn.close()
+                self.db_conn = None
+    
+    def ensure_user_index(self, create: bool = True) -> bool:
+        """ai_analyses の (user_id, analysis_date) インデックスを確認し、無ければ作成 - 戻り値: インデックスの有無"""
         try:
-            conn = sqlite3.connect(self.config["database_path"])
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # ai_analysesテーブルから最新のレコードを取得
-            query = """
-            SELECT * FROM ai_analyses 
-            WHERE user_id = ? 
-            ORDER BY analysis_date DESC 
-            LIMIT 1
-            """
+            with self.db_lock:
+                conn = self.get_connection()
+                for index in conn.execute("PRAGMA index_list(ai_analyses)").fetchall():
+                    columns = [info["name"] for info in conn.execute(f"PRAGMA index_info('{index['name']}')").fetchall()]
+                    if columns[:2] == ["user_id", "analysis_date"]:
+                        return True
             
-            cursor.execute(query, (user_id,))
-            row = cursor.fetchone()
-            
-            if not row:
-                self.DEBUGLOG(f"user_id {user_id} のデータが見つかりません", "WARNING")
-                return None
+            if not create:
+                return False
             
-            # 必要なデータを抽出
-            analysis_text = row["analysis_result"] or ""
-            broadcast_title = row["broadcast_title"] or ""
-            user_name = row["user_name"] or f"user_{user_id}"
-            lv_value = row["broadcast_lv_id"] or "unknown_lv"  # 追加
-            
-            # その他のカラムも取得
-            other_data = {key: row[key] for key in row.keys() 
-                        if key not in ["analysis_result", "broadcast_title", "user_name", "broadcast_lv_id"]}
-            
-            self.DEBUGLOG(f"データ取得完了: user_id={user_id}, user_name={user_name}, lv={lv_value}")
-            
-            conn.close()
-            return analysis_text, broadcast_title, user_name, lv_value, other_data
+            # 作成は書き込み可能な一時接続で行う
+            write_conn = sqlite3.connect(self.config["database_path"], timeout=30)
+            try:
+                write_conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_ai_analyses_user_date ON ai_analyses (user_id, analysis_date)"
+                )
+                write_conn.commit()
+            finally:
+                write_conn.close()
+            self.DEBUGLOG("インデックスを作成しました: idx_ai_analyses_user_date")
+            return True
             
+        except sqlite3.Error as e:
+            self.DEBUGLOG(f"インデックス確認エラー: {e}", "ERROR")
+            return False
+    
+    def row_to_user_data(self, row: sqlite3.Row, user_id: str) -> Tuple[str, str, str, str, Dict[str, Any]]:
+        """ai_analysesの行を (analysis_text, broadcast_title, user_name, lv_value, other_data) に変換"""
+        analysis_text = row["analysis_result"] or ""
+        broadcast_title = row["broadcast_title"] or ""
+        user_name = row["user_name"] or f"user_{user_id}"
+        lv_value = row["broadcast_lv_id"] or "unknown_lv"
+        
+        # その他のカラムも取得
+        other_data = {key: row[key] for key in row.keys()
+                      if key not in ["analysis_result", "broadcast_title", "user_name", "broadcast_lv_id", "rn"]}
+        return analysis_text, broadcast_title, user_name, lv_value, other_data
+    
+    def get_users_data(self, user_ids: List[str]) -> Dict[str, Tuple[str, str, str, str, Dict[str, Any]]]:
+        """複数user_idの最新データを1回の問い合わせで取得 - 戻り値: {user_id: get_user_dataと同じタプル}"""
+        # 文字列・数値どちらで渡されても対応付けられるよう文字列化して照合
+        requested = {str(user_id): user_id for user_id in user_ids}
+        results = {}
+        
+        try:
+            with self.db_lock:
+                conn = self.get_connection()
+                keys = list(requested)
+                # SQLiteのプレースホルダ数上限に収まるよう分割
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    query = f"""
+                    SELECT * FROM (
+                        SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY analysis_date DESC) AS rn
+                        FROM ai_analyses
+                        WHERE user_id IN ({placeholders})
+                    )
+                    WHERE rn = 1
+                    """
+                    for row in conn.execute(query, chunk):
+                        user_id = requested.get(str(row["user_id"]))
+                        if user_id is not None:
+                            results[user_id] = self.row_to_user_data(row, user_id)
         except sqlite3.Error as e:
             self.DEBUGLOG(f"データベースエラー: {e}", "ERROR")
-            return None
-
-            
+            return results
+        
+        for user_id in user_ids:
+            if user_id not in results:
+                self.DEBUGLOG(f"user_id {user_id} のデータが見つかりません", "WARNING")
+        self.DEBUGLOG(f"データ一括取得完了: {len(results)}/{len(requested)}件")
+        return results
+    
+    def get_user_data(self, user_id: str) -> Optional[Tuple[str, str, str, str, Dict[str, Any]]]:
+        """データベースからuser_idの最新データを取得"""
+        user_data = self.get_users_data([user_id]).get(user_id)
+        if user_data:
+            self.DEBUGLOG(f"データ取得完了: user_id={user_id}, user_name={user_data[2]}, lv={user_data[3]}")
+        return user_data
+    
     def remove_html_tags(self, text: str) -> str:
         """HTMLタグを除去"""
         clean_text = re.sub(r'<[^>]+>', '', text)
@@ -121,26 +252,31 @@ class LyricsGenerator:
         
         return prompt
 
-    def call_chatgpt_api(self, prompt: str, prompt_type: str = "opening") -> Optional[Dict[str, Any]]:
-        """ChatGPT APIを呼び出し"""
+    def call_chatgpt_api(self, prompt: str, prompt_type: str = "opening",
+                         on_section: Optional[Callable[[str, Any], None]] = None) -> Optional[Dict[str, Any]]:
+        """ChatGPT APIを呼び出し（ストリーミング時は各セクションが閉じた時点でon_sectionを呼ぶ）"""
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=self.config["openai_api_key"])
-            
             # config.jsonから指定されたタイプのシステムプロンプトを取得
             system_prompt = self.config["prompts"][prompt_type]["system_prompt"]
             
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
+            request = {
+                "model": self.config.get("lyrics_model", "gpt-4"),
+                "messages": [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=2000,
-                temperature=0.7
-            )
+                "max_tokens": 2000,
+                "temperature": 0.7
+            }
+            # JSONモード（対応モデルのみ）: 応答が必ずJSONオブジェクトになる
+            if self.config.get("json_mode", False):
+                request["response_format"] = {"type": "json_object"}
             
-            content = response.choices[0].message.content.strip()
+            if self.config.get("stream_responses", False):
+                content = self.stream_completion(request, on_section)
+            else:
+                response = self.create_completion(**request)
+                content = response.choices[0].message.content.strip()
             self.DEBUGLOG(f"ChatGPT API応答取得完了 ({prompt_type}) (文字数: {len(content)})")
             
             # JSONとして解析を試行
@@ -158,13 +294,79 @@ class LyricsGenerator:
         except Exception as e:
             self.DEBUGLOG(f"API エラー ({prompt_type}): {e}", "ERROR")
             return None
+    
+    def stream_completion(self, request: Dict[str, Any], on_section: Optional[Callable[[str, Any], None]] = None) -> str:
+        """ストリーミングで応答を受信 - 戻り値: 応答全文"""
+        extractor = SectionExtractor()
+        parts = []
+        for chunk in self.create_completion(**request, stream=True):
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            parts.append(text)
+            
+            for key, value in extractor.feed(text):
+                self.DEBUGLOG(f"セクション受信: {key}")
+                if on_section:
+                    on_section(key, value)
+        return "".join(parts).strip()
+
+    def create_completion(self, **kwargs):
+        """Chat Completionを呼び出し（429はRetry-Afterまたは指数バックオフで待って再試行）"""
+        max_retries = self.config.get("openai_max_retries", 5)
+        for attempt in range(max_retries + 1):
+            try:
+                return self.openai_client.chat.completions.create(**kwargs)
+            except openai.RateLimitError as e:
+                if attempt >= max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                try:
+                    wait = float(retry_after)
+                except (TypeError, ValueError):
+                    wait = self.config.get("openai_backoff_base", 2) * (2 ** attempt)
+                self.DEBUGLOG(f"レート制限のため {wait:.1f}秒待機 ({attempt + 1}/{max_retries})", "WARNING")
+                time.sleep(wait)
+    
+    def generate_lyrics_for_users(self, user_ids: List[str], prompt_type: str = "opening",
+                                  max_workers: Optional[int] = None,
+                                  on_saved: Optional[Callable[[str, str], None]] = None) -> Dict[str, bool]:
+        """複数user_idの歌詞を並列生成 - 戻り値: {user_id: 成功/失敗}"""
+        max_workers = max_workers or self.config.get("max_parallel_users", 4)
+        
+        # 全ユーザーのデータを1回の問い合わせで先に取得
+        users_data = self.get_users_data(user_ids)
+        
+        def run(user_id):
+            if user_id not in users_data:
+                return False
+            try:
+                return self.generate_lyrics_for_user(user_id, prompt_type, user_data=users_data[user_id],
+                                                     on_saved=on_saved)
+            except Exception as e:
+                self.DEBUGLOG(f"歌詞生成エラー: user_id={user_id}: {e}", "ERROR")
+                return False
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = dict(zip(user_ids, executor.map(run, user_ids)))
+        
+        self.DEBUGLOG(f"一括歌詞生成: {sum(results.values())}/{len(user_ids)} 成功")
+        return results
+    
+    def generate_lyrics_for_user(self, user_id: str, prompt_type: str = "opening",
+                                 user_data: Optional[Tuple[str, str, str, str, Dict[str, Any]]] = None,
+                                 on_saved: Optional[Callable[[str, str], None]] = None) -> bool:
+        """指定されたuser_idの歌詞を生成（user_dataを渡した場合はデータベースを参照しない）
 
-    def generate_lyrics_for_user(self, user_id: str, prompt_type: str = "opening") -> bool:
-        """指定されたuser_idの歌詞を生成"""
+        on_saved(song_type, file_path) は歌詞ファイルを保存するたびに呼ばれる（後続の画像生成の開始用）。
+        """
         self.DEBUGLOG(f"歌詞生成開始 ({prompt_type}): user_id={user_id}")
         
         # 1. データベースからデータを取得
-        user_data = self.get_user_data(user_id)
+        if user_data is None:
+            user_data = self.get_user_data(user_id)
         if not user_data:
             return False
         
@@ -177,20 +379,39 @@ class LyricsGenerator:
         # 2. プロンプトを生成
         prompt = self.generate_lyrics_prompt(analysis_text, broadcast_title, user_name, prompt_type)
         
-        # 3. ChatGPT APIを呼び出し
-        lyrics_data = self.call_chatgpt_api(prompt, prompt_type)
+        # 3. ChatGPT APIを呼び出し（ストリーミング時は曲ごとに届いた時点で保存）
+        saved_types = set()
+        
+        def on_section(song_type, song_data):
+            if (prompt_type == "both" and song_type in ("opening", "ending") and song_type not in saved_types
+                    and isinstance(song_data, dict) and "lyrics" in song_data):
+                if self.save_lyrics_response(user_name, user_id, song_data, song_type, lv_value, broadcast_title, on_saved):
+                    saved_types.add(song_type)
+        
+        lyrics_data = self.call_chatgpt_api(prompt, prompt_type, on_section=on_section)
         if not lyrics_data:
+            # 片方の曲だけ保存できた場合は失敗扱い（両方揃って成功）
+            if saved_types:
+                self.DEBUGLOG(f"応答の解析に失敗（保存済み: {sorted(saved_types)}）: user_id={user_id}", "ERROR")
             return False
         
-        # 4. 結果を保存
-        success = self.save_lyrics_response(user_name, user_id, lyrics_data, prompt_type, lv_value, broadcast_title)  # 修正
+        # 4. 結果を保存（先に保存済みの曲は除く）
+        if saved_types:
+            lyrics_data = {key: value for key, value in lyrics_data.items() if key not in saved_types}
+        success = self.save_lyrics_response(user_name, user_id, lyrics_data, prompt_type, lv_value, broadcast_title, on_saved)  # 修正
+        if prompt_type == "both":
+            missing = {"opening", "ending"} - saved_types - set(lyrics_data)
+            if missing:
+                self.DEBUGLOG(f"応答に含まれない曲があります: {sorted(missing)}: user_id={user_id}", "ERROR")
+                success = False
         
         if success:
             self.DEBUGLOG(f"歌詞生成完了 ({prompt_type}): user_id={user_id}")
         
         return success
     
-    def save_lyrics_response(self, user_name: str, user_id: str, lyrics_data: Dict[str, Any], prompt_type: str = "opening", lv_value: str = "", broadcast_title: str = "") -> bool:
+    def save_lyrics_response(self, user_name: str, user_id: str, lyrics_data: Dict[str, Any], prompt_type: str = "opening", lv_value: str = "", broadcast_title: str = "",
+                             on_saved: Optional[Callable[[str, str], None]] = None) -> bool:
         """歌詞応答を保存"""
         try:
             # 出力ディレクトリの作成: {lv_value}_{broadcast_title}/ユーザー名_ユーザーID/
@@ -218,6 +439,8 @@ class LyricsGenerator:
                             json.dump(lyrics_data[song_type], f, ensure_ascii=False, indent=2)
                         
                         self.DEBUGLOG(f"歌詞ファイルを保存: {file_path}")
+                        if on_saved:
+                            on_saved(song_type, file_path)
             else:
                 # 単体の場合
                 filename = f"lyrics_{prompt_type}_{timestamp}.json"
@@ -228,6 +451,8 @@ class LyricsGenerator:
                     json.dump(lyrics_data, f, ensure_ascii=False, indent=2)
                 
                 self.DEBUGLOG(f"歌詞ファイルを保存: {file_path}")
+                if on_saved:
+                    on_saved(prompt_type, file_path)
             
             return True
             
@@ -235,14 +460,44 @@ class LyricsGenerator:
             self.DEBUGLOG(f"ファイル保存エラー: {e}", "ERROR")
             return False
 
+class ImageStage:
+    """オープニング・エンディングが揃ったディレクトリから順に画像生成を開始（歌詞生成と並行）"""
+    def __init__(self, max_workers: int = 2):
+        from lyrics_image_generator import LyricsImageGenerator
+        from src.utils.http_client import configure_download_client, download_options_from_config
+        
+        self.image_generator = LyricsImageGenerator()
+        configure_download_client(**download_options_from_config(self.image_generator.config))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._lock = threading.Lock()
+        self.saved_songs = {}
+        self.futures = {}
+    
+    def on_saved(self, song_type: str, file_path: str):
+        """歌詞ファイル保存時のコールバック（両方の曲が揃ったら画像生成を投入）"""
+        lyrics_dir = os.path.dirname(file_path)
+        with self._lock:
+            songs = self.saved_songs.setdefault(lyrics_dir, set())
+            songs.add(song_type)
+            if not {"opening", "ending"} <= songs or lyrics_dir in self.futures:
+                return
+            self.futures[lyrics_dir] = self.executor.submit(self.image_generator.process_directory, lyrics_dir)
+    
+    def wait(self) -> Dict[str, bool]:
+        """投入した画像生成の完了を待つ - 戻り値: {ディレクトリ: 成功/失敗}"""
+        self.executor.shutdown(wait=True)
+        return {lyrics_dir: future.result()[0] for lyrics_dir, future in self.futures.items()}
+
 def main():
     """メイン実行関数"""
-    if len(os.sys.argv) < 2:
-        print("使用方法: python ncv_lyrics_generator.py <user_id> [opening|ending|both]")
+    # --images: 曲が揃ったユーザーから画像生成も開始（both のみ）
+    args = [arg for arg in os.sys.argv[1:] if arg != "--images"]
+    if len(args) < 1:
+        print("使用方法: python ncv_lyrics_generator.py <user_id>[,<user_id>...] [opening|ending|both] [--images]")
         return
     
-    user_id = os.sys.argv[1]
-    prompt_type = os.sys.argv[2] if len(os.sys.argv) > 2 else "both"
+    user_ids = [user_id for user_id in args[0].split(",") if user_id]
+    prompt_type = args[1] if len(args) > 1 else "both"
     
     if prompt_type not in ["opening", "ending", "both"]:
         print("prompt_typeは 'opening' または 'ending' または 'both' を指定してください")
@@ -250,12 +505,27 @@ def main():
     
     try:
         generator = LyricsGenerator()
-        success = generator.generate_lyrics_for_user(user_id, prompt_type)
+        image_stage = None
+        if "--images" in os.sys.argv and prompt_type == "both":
+            image_stage = ImageStage(generator.config.get("max_parallel_image_dirs", 2))
+        on_saved = image_stage.on_saved if image_stage else None
         
-        if success:
-            print(f"歌詞生成が完了しました: user_id={user_id}, type={prompt_type}")
+        if len(user_ids) == 1:
+            results = {user_ids[0]: generator.generate_lyrics_for_user(user_ids[0], prompt_type, on_saved=on_saved)}
         else:
-            print(f"歌詞生成に失敗しました: user_id={user_id}, type={prompt_type}")
+            results = generator.generate_lyrics_for_users(user_ids, prompt_type, on_saved=on_saved)
+        
+        generator.close()
+        for user_id, success in results.items():
+            if success:
+                print(f"歌詞生成が完了しました: user_id={user_id}, type={prompt_type}")
+            else:
+                print(f"歌詞生成に失敗しました: user_id={user_id}, type={prompt_type}")
+        
+        if image_stage:
+            for lyrics_dir, success in image_stage.wait().items():
+                status = "完了" if success else "失敗"
+                print(f"画像生成{status}: {lyrics_dir}")
             
     except Exception as e:
         print(f"エラーが発生しました: {e}")
@@ -4,6 +4,7 @@ import os
 from .core.config_manager import ConfigManager
 from .core.model_manager import ModelManager
 from .core.image_generator import ImageGenerator
+from .utils.http_client import configure_download_client, download_options_from_config
 from .ui.main_window import MainWindow
 
 # D&D対応のインポート
@@ -24,7 +25,25 @@ class FluxGUIApp:
         # コアコンポーネントを初期化
         self.config_manager = ConfigManager()
         self.model_manager = ModelManager()
-        self.image_generator = ImageGenerator(self.output_dir)
+        configure_download_client(**download_options_from_config(self.config_manager))
+        self.image_generator = ImageGenerator(
+            self.output_dir,
+            max_in_flight=self.config_manager.get("max_concurrent_jobs", 4),
+            poll_interval=self.config_manager.get("job_poll_interval", 0.5),
+            journal_file=self.config_manager.get("job_journal_file", "generation_jobs.jsonl"),
+            upload_cache_file=self.config_manager.get("upload_cache_file", "upload_cache.json"),
+            model_manager=self.model_manager,
+            input_options={
+                "enabled": self.config_manager.get("input_preprocess", True),
+                "format": self.config_manager.get("input_image_format", "JPEG"),
+                "quality": self.config_manager.get("input_image_quality", 90)
+            },
+            result_cache_max_bytes=(
+                self.config_manager.get("result_cache_max_mb", 1024) * 1024 * 1024
+                if self.config_manager.get("use_result_cache", True) else None
+            ),
+            max_save_attempts=self.config_manager.get("max_save_attempts", 3)
+        )
         
         # D&D対応のメインウィンドウを作成
         if DND_AVAILABLE:
@@ -40,11 +59,15 @@ class FluxGUIApp:
             model_manager=self.model_manager,
             image_generator=self.image_generator
         )
+        
+        # 前回の未完了ジョブを再開（再生成せずにリモートの結果を取得）
+        self.root.after(0, self.main_window.generation_handler.resume_pending_jobs)
     
     def run(self):
         """アプリケーションを実行"""
         try:
             self.root.mainloop()
+            self.image_generator.shutdown()
         except KeyboardInterrupt:
             self.shutdown()
         except Exception as e:
@@ -53,6 +76,8 @@ class FluxGUIApp:
     
     def shutdown(self):
         """アプリケーションを終了"""
+        self.image_generator.shutdown()
+        self.config_manager.close()
         if self.root:
             self.root.quit()
             self.root.destroy()
\ No newline at end of file
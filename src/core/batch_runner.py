@@ -0,0 +1,252 @@
+"""ヘッドレスの一括生成ランナー（JSONL/CSVのプロンプトを並列実行）"""
+import csv
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from ..utils.file_utils import save_result_image
+from ..utils.rate_limiter import RateLimiter
+
+# CSVの値を数値・真偽値に変換する列
+INT_FIELDS = ("num_inference_steps", "num_images", "seed", "width", "height")
+FLOAT_FIELDS = ("guidance_scale", "strength")
+BOOL_FIELDS = ("enable_safety_checker",)
+
+# 再試行するHTTPステータス（それ以外の4xxは入力の誤りなので再試行しない）
+RETRY_STATUSES = (408, 409, 429)
+
+class BatchRunner:
+    def __init__(self, image_generator, model_manager, config_manager, api_key,
+                 output_dir, rate_per_second=2.0, max_retries=3, retry_delay=2.0, max_workers=None):
+        self.image_generator = image_generator
+        self.model_manager = model_manager
+        self.config_manager = config_manager
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # 投入エンジンの同時実行数に合わせて待機スレッドを用意
+        self.max_workers = max_workers or image_generator.engine.max_in_flight * 2
+        self._manifest_lock = threading.Lock()
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+    def load_jobs(self, input_file):
+        """JSONLまたはCSVからジョブ定義を読み込み"""
+        jobs = []
+        if input_file.lower().endswith(".csv"):
+            with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+                for row in csv.DictReader(f):
+                    jobs.append(self.convert_csv_row(row))
+        else:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        jobs.append(json.loads(line))
+
+        # IDはファイル名に使うため、無害化後に重複するものも拒否（上書き防止）
+        seen = {}
+        for index, job in enumerate(jobs):
+            job["id"] = str(job.get("id", f"{index:05d}"))
+            file_id = self.make_file_id(job["id"])
+            if file_id in seen:
+                raise ValueError(f"ジョブIDが重複しています: {seen[file_id]!r} と {job['id']!r}")
+            seen[file_id] = job["id"]
+        return jobs
+
+    @staticmethod
+    def make_file_id(job_id):
+        """ジョブIDをファイル名に使える形に変換"""
+        return re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', job_id)
+
+    def convert_csv_row(self, row):
+        """CSVの行を型付きの辞書に変換（空欄は未指定扱い）"""
+        job = {}
+        for key, value in row.items():
+            if key is None or value is None or value.strip() == "":
+                continue
+            value = value.strip()
+            if key in INT_FIELDS:
+                job[key] = int(value)
+            elif key in FLOAT_FIELDS:
+                job[key] = float(value)
+            elif key in BOOL_FIELDS:
+                job[key] = value.lower() in ("1", "true", "yes", "on")
+            else:
+                job[key] = value
+        return job
+
+    def build_request(self, job):
+        """ジョブ定義から (エンドポイント, パラメータ, 入力画像) を構築"""
+        endpoint = job.get("model") or self.config_manager.get("default_model", "fal-ai/flux/dev")
+        model_params = self.model_manager.get_model_parameters(endpoint)
+
+        num_inference_steps = job.get("num_inference_steps", model_params.get("default_inference_steps", 28))
+        guidance_scale = job.get("guidance_scale", model_params.get("default_guidance_scale", 3.5))
+        num_images = job.get("num_images", self.config_manager.get("default_num_images", 1))
+        enable_safety_checker = job.get("enable_safety_checker", model_params.get("default_safety_checker", True))
+
+        if self.model_manager.is_image_to_image_model(endpoint):
+            if not job.get("image"):
+                raise ValueError(f"image-to-imageモデルには image の指定が必要です: {endpoint}")
+
+            params = self.image_generator.build_image_to_image_params(
+                prompt=job["prompt"],
+                negative_prompt=job.get("negative_prompt", ""),
+                image_url=None,
+                strength=job.get("strength", model_params.get("default_strength", 0.95)),
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                num_images=num_images,
+                enable_safety_checker=enable_safety_checker,
+                seed=job.get("seed")
+            )
+            return endpoint, params, job["image"]
+
+        if "width" in job and "height" in job:
+            image_size_params = {"width": job["width"], "height": job["height"]}
+        else:
+            image_size_params = job.get("image_size", self.config_manager.get("default_image_size", "landscape_4_3"))
+
+        params = self.image_generator.build_text_to_image_params(
+            prompt=job["prompt"],
+            negative_prompt=job.get("negative_prompt", ""),
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            num_images=num_images,
+            enable_safety_checker=enable_safety_checker,
+            image_size_params=image_size_params,
+            seed=job.get("seed")
+        )
+        return endpoint, params, None
+
+    def load_completed_ids(self, manifest_file):
+        """マニフェストから成功済みのジョブIDを取得（再実行時のスキップ用）"""
+        completed = set()
+        if not os.path.exists(manifest_file):
+            return completed
+
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("success"):
+                    completed.add(record["id"])
+        return completed
+
+    def run(self, input_file, manifest_file, resume=True, on_progress=None):
+        """一括生成を実行 - 戻り値: (成功件数, 全件数)"""
+        jobs = self.load_jobs(input_file)
+        if resume:
+            completed = self.load_completed_ids(manifest_file)
+            jobs = [job for job in jobs if job["id"] not in completed]
+
+        success_count = 0
+        done_count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.run_job, job) for job in jobs]
+            for future in as_completed(futures):
+                record = future.result()
+                self.write_manifest(manifest_file, record)
+                done_count += 1
+                if record["success"]:
+                    success_count += 1
+                if on_progress:
+                    on_progress(done_count, len(jobs), record)
+
+        return success_count, len(jobs)
+
+    def run_job(self, job):
+        """1ジョブを実行（失敗時はバックオフしながら再試行）"""
+        record = {"id": job["id"], "prompt": job.get("prompt", ""), "success": False, "attempts": 0}
+        started = time.monotonic()
+
+        try:
+            endpoint, params, source_image = self.build_request(job)
+        except Exception as e:
+            record["error"] = str(e)
+            return record
+
+        record.update({"endpoint": endpoint, "params": params, "source_image": source_image})
+
+        for attempt in range(1, self.max_retries + 1):
+            record["attempts"] = attempt
+            self.rate_limiter.acquire()
+            future = self.image_generator.submit(
+                self.api_key, endpoint, params, source_image=source_image
+            )
+            result = future.result()
+            if result["success"]:
+                break
+
+            record["error"] = result["error"]
+            if not self.is_retryable(result) or attempt == self.max_retries:
+                record["elapsed"] = round(time.monotonic() - started, 3)
+                return record
+            time.sleep(self.retry_delay * (2 ** (attempt - 1)))
+
+        # 保存の失敗では再生成せず（再課金になる）、取得済みの結果の保存だけを再試行
+        files = None
+        for save_attempt in range(1, self.max_retries + 1):
+            files = self.save_results(job["id"], result["data"])
+            if files is not None:
+                break
+            if save_attempt < self.max_retries:
+                time.sleep(self.retry_delay * (2 ** (save_attempt - 1)))
+
+        if files is None:
+            record["error"] = "画像保存エラー"
+        else:
+            if not result.get("cached"):
+                self.image_generator.store_cached_result(
+                    future.cache_key,
+                    [os.path.join(self.output_dir, item["file"]) for item in files],
+                    result["data"]
+                )
+            record.update({
+                "success": True,
+                "request_id": result.get("request_id"),
+                "cached": bool(result.get("cached")),
+                "files": files,
+                "seed": result["data"].get("seed"),
+                "error": None
+            })
+
+        record["elapsed"] = round(time.monotonic() - started, 3)
+        return record
+
+    def is_retryable(self, result):
+        """失敗結果が再試行で成功し得るか（通信エラー・タイムアウト・429・5xx）"""
+        status_code = result.get("status_code")
+        return status_code is None or status_code in RETRY_STATUSES or status_code >= 500
+
+    def save_results(self, job_id, data):
+        """結果画像をストリーミング保存 - 戻り値: 保存ファイルのリスト（失敗時はNone）"""
+        files = []
+        for i, image_data in enumerate(data.get("images", [])):
+            filepath = os.path.join(self.output_dir, f"batch_{self.make_file_id(job_id)}_{i+1}.png")
+            save_result = save_result_image(image_data, filepath)
+            if not save_result["success"]:
+                return None
+            files.append({
+                "file": os.path.basename(save_result["filepath"]),
+                "url": image_data.get("url"),
+                "sha256": save_result.get("sha256"),
+                "size": save_result["size"]
+            })
+        return files
+
+    def write_manifest(self, manifest_file, record):
+        """マニフェストに1行追記"""
+        record = {**record, "timestamp": datetime.now().isoformat()}
+        with self._manifest_lock:
+            with open(manifest_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
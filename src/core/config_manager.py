@@ -8,8 +8,19 @@ class ConfigManager:
     def __init__(self, config_file="config.json"):
         self.config_file = config_file
         self.auto_save = True
-        self.auto_save_delay = 2  # 2秒後に自動保存
-        self.save_timer = None
+        self.auto_save_delay = 2  # 最後の変更から2秒後に自動保存
+        
+        # 自動保存は1本の書き込みスレッドがまとめて行う（変更のたびにスレッドを作らない）
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._last_change = 0.0
+        self._last_written = None
+        # 内容を取得した順の番号（古い内容で新しい書き込みを上書きしないため）
+        self._snapshot_version = 0
+        self._written_version = 0
+        self._writer = None
+        self._closed = False
         
         self.default_config = {
             "api_key": "",
@@ -30,7 +41,25 @@ class ConfigManager:
             "window_x": None,
             "window_y": None,
             "last_mode": "text-to-image",
-            "auto_save_prompts": True
+            "auto_save_prompts": True,
+            "max_concurrent_jobs": 4,
+            "job_poll_interval": 0.5,
+            "job_journal_file": "generation_jobs.jsonl",
+            "postprocess_workers": 4,
+            "upload_cache_file": "upload_cache.json",
+            "input_preprocess": True,
+            "input_image_format": "JPEG",
+            "input_image_quality": 90,
+            "use_result_cache": True,
+            "result_cache_max_mb": 1024,
+            "download_max_concurrency": 8,
+            "download_connect_timeout": 5.0,
+            "download_read_timeout": 60.0,
+            "download_retries": 3,
+            "download_http2": None,
+            "max_save_attempts": 3,
+            # モデルごとの1枚あたりの推定コスト（USD）の上書き {エンドポイント: 金額}
+            "estimated_cost_per_image": {}
         }
         self.config = self.load_config()
     
@@ -38,41 +67,115 @@ class ConfigManager:
         """設定を読み込み"""
         try:
             with open(self.config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # デフォルト値で不足キーを補完
-                for key, value in self.default_config.items():
-                    if key not in config:
-                        config[key] = value
-                return config
+                content = f.read()
+            config = json.loads(content)
+            # 未変更の内容を再度書き込まないよう記憶
+            self._last_written = content
+            # デフォルト値で不足キーを補完
+            for key, value in self.default_config.items():
+                if key not in config:
+                    config[key] = value
+            return config
         except FileNotFoundError:
             self.save_config(self.default_config)
             return self.default_config.copy()
     
+    def serialize(self, config):
+        """保存用の文字列に変換"""
+        return json.dumps(config, indent=4, ensure_ascii=False)
+    
+    def take_snapshot(self, config=None):
+        """保存する内容と番号を取得（self._condを保持して呼ぶ）"""
+        if config is not None:
+            self.config = config
+        self._dirty = False
+        self._snapshot_version += 1
+        return self.serialize(self.config), self._snapshot_version
+    
+    def write_if_changed(self, content, version=None):
+        """内容が前回の書き込みと異なる場合のみアトミックに書き込み（一時ファイル＋fsync＋リネーム）
+        
+        versionが書き込み済みの内容より古い場合は書き込まない。
+        """
+        with self._write_lock:
+            if version is not None:
+                if version <= self._written_version:
+                    return False
+                self._written_version = version
+            if content == self._last_written:
+                return False
+            
+            temp_file = f"{self.config_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.config_file)
+            self._last_written = content
+            return True
+    
     def save_config(self, config=None):
         """設定を即座に保存"""
-        if config is None:
-            config = self.config
-        
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
-            
-            self.config = config
+            with self._cond:
+                content, version = self.take_snapshot(config)
+            self.write_if_changed(content, version)
         except Exception as e:
             print(f"設定保存エラー: {e}")
     
     def auto_save_config(self):
-        """自動保存（遅延実行）"""
+        """自動保存（遅延実行）- 変更を記録し、書き込みスレッドに通知"""
         if not self.auto_save:
             return
-            
-        # 既存のタイマーをキャンセル
-        if self.save_timer:
-            self.save_timer.cancel()
         
-        # 新しいタイマーを設定
-        self.save_timer = threading.Timer(self.auto_save_delay, self.save_config)
-        self.save_timer.start()
+        with self._cond:
+            self._dirty = True
+            self._last_change = time.monotonic()
+            if self._writer is None and not self._closed:
+                self._writer = threading.Thread(target=self._writer_loop, name="ConfigWriter", daemon=True)
+                self._writer.start()
+            self._cond.notify()
+    
+    def _writer_loop(self):
+        """書き込みスレッド: 変更が auto_save_delay 秒途切れたら1回だけ保存"""
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                
+                # 連続した変更は最後の変更から一定時間待ってまとめる
+                while self._dirty and not self._closed:
+                    remaining = self._last_change + self.auto_save_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._dirty or self._closed:
+                    continue
+                
+                content, version = self.take_snapshot()
+            
+            try:
+                self.write_if_changed(content, version)
+            except Exception as e:
+                print(f"設定保存エラー: {e}")
+    
+    def flush(self):
+        """未保存の変更があれば即座に保存"""
+        with self._cond:
+            dirty = self._dirty
+        if dirty:
+            self.save_config()
+    
+    def close(self):
+        """未保存の変更を保存して書き込みスレッドを停止"""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
     
     def get(self, key, default=None):
         """設定値を取得"""
@@ -80,13 +183,15 @@ class ConfigManager:
     
     def set(self, key, value):
         """設定値を更新（自動保存付き）"""
-        self.config[key] = value
+        with self._cond:
+            self.config[key] = value
         if self.auto_save:
             self.auto_save_config()
     
     def update(self, updates):
         """複数の設定値を一括更新（自動保存付き）"""
-        self.config.update(updates)
+        with self._cond:
+            self.config.update(updates)
         if self.auto_save:
             self.auto_save_config()
     
@@ -137,7 +242,8 @@ class ConfigManager:
                 if not isinstance(value, (int, float)) or value < 0:
                     return
                     
-            self.config[key] = value
+            with self._cond:
+                self.config[key] = value
             if self.auto_save:
                 self.auto_save_config()
         except Exception as e:
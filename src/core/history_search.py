@@ -0,0 +1,339 @@
+"""プロンプト履歴の検索インデックス（転置インデックス、前方一致・あいまい一致、BM25＋新しさ＋使用回数で順位付け）"""
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+# 英数字の単語、「3月」などの日付表記、日本語の連続文字
+TOKEN_PATTERN = re.compile(r"[0-9]+[年月日]|[a-z0-9]+|[぀-ヿ㐀-鿿ｦ-ﾟ々ー]+")
+
+MONTH_NAMES = ("january", "february", "march", "april", "may", "june", "july",
+               "august", "september", "october", "november", "december")
+
+# 日付の検索語（"march"・"mar"・"3月"・"2026" など）
+DATE_TERM_PATTERN = re.compile(r"[0-9]+[年月日]|(?:19|20)[0-9]{2}|" + "|".join(
+    f"{month[:3]}(?:{month[3:]})?" for month in MONTH_NAMES))
+
+# 検索語としては意味の薄い語（順位付けに使わない）
+STOP_WORDS = frozenset(("a", "an", "and", "the", "that", "this", "of", "in", "on", "at", "to",
+                        "with", "from", "for", "by", "is", "it", "my", "prompt", "prompts"))
+
+# BM25のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# ネガティブプロンプト中の語の重み
+NEGATIVE_WEIGHT = 0.3
+
+# 一致の種類ごとの重み（完全一致 > 前方一致 > あいまい一致）
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.5
+
+# 前方一致で展開する語数の上限
+MAX_PREFIX_EXPANSIONS = 50
+
+# あいまい一致の対象にする語の最小文字数
+FUZZY_MIN_LENGTH = 4
+
+# 日付の語の重み（内容の語で見つかったエントリの順位を上げるだけに使う）
+DATE_WEIGHT = 0.3
+
+# 順位付けするエントリ数の上限（超えた分は他の検索語との共通部分・新しいものに絞る）
+MAX_SCORED_CANDIDATES = 2000
+
+# 新しさの半減期（日）と、新しさ・使用回数の重み
+RECENCY_HALF_LIFE_DAYS = 30.0
+RECENCY_WEIGHT = 0.2
+USAGE_WEIGHT = 0.1
+
+def tokenize(text):
+    """テキストを検索語に分割（日本語は2文字ずつ区切る）"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token[0].isascii():
+            tokens.append(token)
+        elif len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+def date_tokens(timestamp):
+    """日時から検索語を作成（"march"・"mar"・"3月"・"2025" など）"""
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return []
+    month = MONTH_NAMES[dt.month - 1]
+    return [month, month[:3], f"{dt.month}月", str(dt.year), f"{dt.year}年", f"{dt.day}日"]
+
+def parse_timestamp(timestamp):
+    """ISO形式の日時をUNIX時刻に変換（不明な場合は0）"""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+def deletes(token):
+    """1文字削除した語の集合（symmetric delete方式のあいまい一致用）"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def edit_distance(a, b, max_distance=1):
+    """編集距離（隣接文字の入れ替えを1回と数える）- max_distanceを超えたら打ち切り"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class HistorySearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def clear(self):
+        """インデックスを空にする"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        # 語 -> {エントリID: 重み付き出現回数}
+        self.postings = {}
+        # エントリID -> {語: 重み付き出現回数}（削除・更新用）
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        # エントリID -> (UNIX時刻, 使用回数)
+        self.doc_info = {}
+        self.total_length = 0.0
+        # 前方一致用のソート済み語彙と、あいまい一致用の削除語 -> 語
+        self.vocabulary = []
+        self.delete_map = {}
+
+    def build(self, entries):
+        """エントリ一覧からインデックスを作り直す"""
+        with self._lock:
+            self._reset()
+            for entry in entries:
+                self._add(entry)
+
+    def add(self, entry):
+        """エントリを追加（同じIDがあれば置き換え）"""
+        with self._lock:
+            self._add(entry)
+
+    def remove(self, entry_id):
+        """エントリを削除"""
+        with self._lock:
+            self._remove(entry_id)
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def _add(self, entry):
+        entry_id = entry["id"]
+        if entry_id in self.doc_terms:
+            self._remove(entry_id)
+
+        terms = {}
+        for token in tokenize(entry.get("prompt", "")):
+            terms[token] = terms.get(token, 0.0) + 1.0
+        for token in tokenize(entry.get("negative_prompt", "")):
+            terms[token] = terms.get(token, 0.0) + NEGATIVE_WEIGHT
+        length = sum(terms.values())
+        # 日付の語は文書長に含めない
+        for token in date_tokens(entry.get("timestamp")):
+            terms[token] = terms.get(token, 0.0) + 1.0
+
+        self.doc_terms[entry_id] = terms
+        self.doc_lengths[entry_id] = length
+        self.doc_info[entry_id] = (parse_timestamp(entry.get("timestamp")), entry.get("use_count", 1))
+        self.total_length += length
+
+        for token, weight in terms.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self._add_vocabulary(token)
+            postings[entry_id] = weight
+
+    def _remove(self, entry_id):
+        terms = self.doc_terms.pop(entry_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(entry_id)
+        self.doc_info.pop(entry_id, None)
+        for token in terms:
+            postings = self.postings[token]
+            postings.pop(entry_id, None)
+            if not postings:
+                del self.postings[token]
+                self._remove_vocabulary(token)
+
+    def _add_vocabulary(self, token):
+        bisect.insort(self.vocabulary, token)
+        if len(token) >= FUZZY_MIN_LENGTH:
+            for variant in deletes(token) | {token}:
+                self.delete_map.setdefault(variant, set()).add(token)
+
+    def _remove_vocabulary(self, token):
+        index = bisect.bisect_left(self.vocabulary, token)
+        if index < len(self.vocabulary) and self.vocabulary[index] == token:
+            del self.vocabulary[index]
+        if len(token) >= FUZZY_MIN_LENGTH:
+            for variant in deletes(token) | {token}:
+                tokens = self.delete_map.get(variant)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.delete_map[variant]
+
+    def expand_term(self, term):
+        """検索語を索引中の語に展開 - 戻り値: {語: 一致の重み}"""
+        expansions = {}
+        if term in self.postings:
+            expansions[term] = 1.0
+
+        # 前方一致（入力途中の語）
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+            if not token.startswith(term):
+                break
+            expansions.setdefault(token, PREFIX_WEIGHT)
+
+        # あいまい一致（索引に無い語のみ、編集距離1、削除語の辞書で候補を絞る）
+        if term not in self.postings and len(term) >= FUZZY_MIN_LENGTH:
+            candidates = set()
+            for variant in deletes(term) | {term}:
+                candidates.update(self.delete_map.get(variant, ()))
+            for token in candidates:
+                if token not in expansions and edit_distance(term, token) <= 1:
+                    expansions[token] = FUZZY_WEIGHT
+        return expansions
+
+    def search(self, query, limit=None, now=None):
+        """検索して関連度の高い順にエントリIDを返す（最大 MAX_SCORED_CANDIDATES 件）"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        # 意味の薄い語だけの検索ならそのまま使う
+        terms = [term for term in terms if term not in STOP_WORDS] or terms
+        if not terms:
+            return []
+
+        # 日付の語は内容の語と一緒に指定された場合、順位の補正だけに使う
+        content_terms = [term for term in terms if not DATE_TERM_PATTERN.fullmatch(term)]
+        date_terms = [term for term in terms if DATE_TERM_PATTERN.fullmatch(term)] if content_terms else []
+        if not content_terms:
+            content_terms = terms
+
+        now = now or time.time()
+        with self._lock:
+            doc_count = len(self.doc_terms)
+            if not doc_count:
+                return []
+            average_length = max(self.total_length / doc_count, 1.0)
+
+            expanded = [(term, self.expand_term(term)) for term in content_terms]
+            expanded = [(term, expansions) for term, expansions in expanded if expansions]
+            if not expanded:
+                return []
+
+            candidates = self.select_candidates(expanded)
+
+            scores = dict.fromkeys(candidates, 0.0)
+            matched_terms = dict.fromkeys(candidates, 0)
+            for _, expansions in expanded:
+                # 語ごとに、エントリ内で最も良い一致だけを数える
+                best = {}
+                for token, match_weight in expansions.items():
+                    self.score_token(token, match_weight, candidates, best, doc_count, average_length)
+                for entry_id, score in best.items():
+                    scores[entry_id] += score
+                    matched_terms[entry_id] += 1
+
+            for term in date_terms:
+                if term in self.postings:
+                    best = {}
+                    self.score_token(term, DATE_WEIGHT, candidates, best, doc_count, average_length)
+                    for entry_id, score in best.items():
+                        scores[entry_id] += score
+                        matched_terms[entry_id] += 1
+
+            term_count = len(expanded) + len(date_terms)
+            ranked = []
+            for entry_id, score in scores.items():
+                timestamp, use_count = self.doc_info[entry_id]
+                age_days = max(0.0, now - timestamp) / 86400 if timestamp else None
+                recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS) if age_days is not None else 0.0
+                # 多くの検索語に一致したものを優先
+                coverage = matched_terms[entry_id] / term_count
+                boost = 1 + RECENCY_WEIGHT * recency + USAGE_WEIGHT * math.log1p(use_count)
+                ranked.append((score * coverage * coverage * boost, timestamp, entry_id))
+
+        ranked.sort(reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [entry_id for _, _, entry_id in ranked]
+
+    def term_entries(self, expansions):
+        """展開した語のいずれかを含むエントリIDの集合"""
+        entries = set()
+        for token in expansions:
+            entries |= self.postings[token].keys()
+        return entries
+
+    def select_candidates(self, expanded):
+        """順位付けするエントリを選ぶ（出現数の少ない語から和集合、多すぎれば共通部分・新しい順に絞る）"""
+        expanded = sorted(expanded, key=lambda item: sum(len(self.postings[token]) for token in item[1]))
+        candidates = self.term_entries(expanded[0][1])
+        remaining = expanded[1:]
+
+        # 珍しい語は上限までいずれかに一致するエントリを集める
+        while remaining and len(candidates) < MAX_SCORED_CANDIDATES:
+            entries = self.term_entries(remaining[0][1])
+            if len(candidates | entries) > MAX_SCORED_CANDIDATES:
+                break
+            candidates |= entries
+            remaining.pop(0)
+
+        # よく出る語しか残っていなければ、すべてに一致するエントリに絞る
+        for _, expansions in remaining:
+            if len(candidates) <= MAX_SCORED_CANDIDATES:
+                break
+            narrowed = candidates & self.term_entries(expansions)
+            if narrowed:
+                candidates = narrowed
+
+        # それでも多い場合は新しいもの（IDの大きいもの）を優先
+        if len(candidates) > MAX_SCORED_CANDIDATES:
+            candidates = set(sorted(candidates, reverse=True)[:MAX_SCORED_CANDIDATES])
+        return candidates
+
+    def score_token(self, token, match_weight, candidates, best, doc_count, average_length):
+        """候補エントリのうち語を含むもののBM25スコアを best に反映"""
+        postings = self.postings[token]
+        idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        # 候補と出現リストの小さい方を走査
+        if len(postings) <= len(candidates):
+            pairs = ((entry_id, tf) for entry_id, tf in postings.items() if entry_id in candidates)
+        else:
+            pairs = ((entry_id, postings[entry_id]) for entry_id in candidates if entry_id in postings)
+        for entry_id, tf in pairs:
+            length = self.doc_lengths[entry_id]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            score = match_weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if score > best.get(entry_id, 0.0):
+                best[entry_id] = score
@@ -0,0 +1,244 @@
+"""プロンプト履歴の保存先（SQLite、検索はhistory_searchのメモリ上のインデックスで行う）"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+# 一覧の並び順（キー -> ORDER BY句）
+SORT_ORDERS = {
+    "newest": "timestamp DESC, id DESC",
+    "most_used": "generation_count DESC, use_count DESC, timestamp DESC, id DESC",
+    # 生成実績の無いエントリは末尾
+    "fastest": "generation_count = 0, total_latency / generation_count, timestamp DESC, id DESC",
+    "cheapest": "image_count = 0, total_cost / image_count, timestamp DESC, id DESC"
+}
+
+# 生成統計の列（古いDBには起動時に追加）
+STATS_COLUMNS = {
+    "generation_count": "INTEGER NOT NULL DEFAULT 0",
+    "image_count": "INTEGER NOT NULL DEFAULT 0",
+    "total_latency": "REAL NOT NULL DEFAULT 0",
+    "total_cost": "REAL NOT NULL DEFAULT 0",
+    "last_generated_at": "TEXT"
+}
+
+class HistoryStore:
+    def __init__(self, db_file="prompt_history.db", legacy_file="prompt_history.json"):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+
+        if legacy_file:
+            self.migrate_from_json(legacy_file)
+
+    def create_tables(self):
+        """テーブルを作成（プロンプト＋ネガティブプロンプトのハッシュで重複を判定）"""
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL UNIQUE,
+                    prompt TEXT NOT NULL,
+                    negative_prompt TEXT NOT NULL DEFAULT '',
+                    created_at TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    use_count INTEGER NOT NULL DEFAULT 1
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries (timestamp);
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS entry_models (
+                    entry_id INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    generation_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (entry_id, model)
+                );
+                CREATE TABLE IF NOT EXISTS entry_outputs (
+                    entry_id INTEGER NOT NULL,
+                    filepath TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_entry_outputs_entry ON entry_outputs (entry_id);
+                -- 以前のFTS5索引（検索はメモリ上のインデックスに移行）
+                DROP TRIGGER IF EXISTS entries_ai;
+                DROP TRIGGER IF EXISTS entries_ad;
+                DROP TABLE IF EXISTS entries_fts;
+            """)
+            existing = {row["name"] for row in self.conn.execute("PRAGMA table_info(entries)")}
+            for column, definition in STATS_COLUMNS.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE entries ADD COLUMN {column} {definition}")
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(prompt, negative_prompt=""):
+        """重複判定用のキー"""
+        return hashlib.sha256(f"{prompt}\0{negative_prompt}".encode("utf-8")).hexdigest()
+
+    def add(self, prompt, negative_prompt="", timestamp=None):
+        """履歴に追加（既存の場合は日時と使用回数を更新）- 戻り値: エントリID"""
+        timestamp = timestamp or datetime.now().isoformat()
+        key = self.make_key(prompt, negative_prompt)
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO entries (key, prompt, negative_prompt, created_at, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET timestamp = excluded.timestamp, use_count = use_count + 1
+            """, (key, prompt, negative_prompt, timestamp, timestamp))
+            self.conn.commit()
+            return self.conn.execute("SELECT id FROM entries WHERE key = ?", (key,)).fetchone()["id"]
+
+    def get(self, entry_id):
+        """IDでエントリを取得"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count(self):
+        """件数"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def list(self, offset=0, limit=100, order="newest"):
+        """指定の順（既定は新しい順）にページ単位で取得"""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM entries ORDER BY {SORT_ORDERS[order]} LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_ids(self, order="newest"):
+        """全エントリIDを指定の順に取得（表示側で必要な行だけ読み込む用）"""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT id FROM entries ORDER BY {SORT_ORDERS[order]}").fetchall()
+        return [row[0] for row in rows]
+
+    def get_many(self, entry_ids):
+        """複数IDのエントリをまとめて取得 - 戻り値: {ID: エントリ}"""
+        entry_ids = list(entry_ids)
+        entries = {}
+        with self._lock:
+            for i in range(0, len(entry_ids), 500):
+                chunk = entry_ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT * FROM entries WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                entries.update((row["id"], dict(row)) for row in rows)
+        return entries
+
+    def all_entries(self):
+        """全エントリを取得（検索インデックスの構築用）"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, prompt, negative_prompt, timestamp, use_count FROM entries"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_generation(self, prompt, negative_prompt="", model=None, latency=0.0,
+                          output_files=(), cost=0.0, create=True):
+        """生成1回分の実績を集計に加算 - 戻り値: エントリID
+
+        履歴に無いプロンプトはcreate=Trueならエントリを作成し、Falseなら記録せずNoneを返す。
+        """
+        key = self.make_key(prompt, negative_prompt)
+        now = datetime.now().isoformat()
+        output_files = list(output_files)
+        with self._lock:
+            if create:
+                self.conn.execute("""
+                    INSERT INTO entries (key, prompt, negative_prompt, created_at, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO NOTHING
+                """, (key, prompt, negative_prompt, now, now))
+            row = self.conn.execute("SELECT id FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            entry_id = row["id"]
+
+            self.conn.execute("""
+                UPDATE entries SET generation_count = generation_count + 1,
+                    image_count = image_count + ?, total_latency = total_latency + ?,
+                    total_cost = total_cost + ?, last_generated_at = ?
+                WHERE id = ?
+            """, (len(output_files), latency, cost, now, entry_id))
+            if model:
+                self.conn.execute("""
+                    INSERT INTO entry_models (entry_id, model, generation_count) VALUES (?, ?, 1)
+                    ON CONFLICT (entry_id, model) DO UPDATE SET generation_count = generation_count + 1
+                """, (entry_id, model))
+            self.conn.executemany(
+                "INSERT INTO entry_outputs (entry_id, filepath, created_at) VALUES (?, ?, ?)",
+                [(entry_id, filepath, now) for filepath in output_files]
+            )
+            self.conn.commit()
+        return entry_id
+
+    def get_usage(self, entry_id, max_outputs=20):
+        """エントリの使用モデルと出力ファイル（新しい順）を取得"""
+        with self._lock:
+            models = self.conn.execute(
+                "SELECT model, generation_count FROM entry_models WHERE entry_id = ? "
+                "ORDER BY generation_count DESC", (entry_id,)
+            ).fetchall()
+            outputs = self.conn.execute(
+                "SELECT filepath FROM entry_outputs WHERE entry_id = ? ORDER BY rowid DESC LIMIT ?",
+                (entry_id, max_outputs)
+            ).fetchall()
+        return {
+            "models": {row["model"]: row["generation_count"] for row in models},
+            "outputs": [row["filepath"] for row in outputs]
+        }
+
+    def delete(self, entry_id):
+        """エントリを削除"""
+        with self._lock:
+            self.conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            self.conn.execute("DELETE FROM entry_models WHERE entry_id = ?", (entry_id,))
+            self.conn.execute("DELETE FROM entry_outputs WHERE entry_id = ?", (entry_id,))
+            self.conn.commit()
+
+    def clear(self):
+        """全履歴を削除"""
+        with self._lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM entry_models")
+            self.conn.execute("DELETE FROM entry_outputs")
+            self.conn.commit()
+
+    def migrate_from_json(self, legacy_file):
+        """旧形式の prompt_history.json を一度だけ取り込む"""
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE name = 'migrated_json'").fetchone()
+        if done or not os.path.exists(legacy_file):
+            return 0
+
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                prompts = json.load(f).get("prompts", [])
+        except Exception as e:
+            print(f"履歴の移行エラー: {e}")
+            return 0
+
+        # 古い順に追加して日時の順序を保つ
+        for entry in reversed(prompts):
+            if entry.get("prompt", "").strip():
+                self.add(entry["prompt"], entry.get("negative_prompt", ""), entry.get("timestamp"))
+
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated_json', ?)",
+                              (datetime.now().isoformat(),))
+            self.conn.commit()
+        return len(prompts)
+
+    def close(self):
+        """接続を閉じる"""
+        with self._lock:
+            self.conn.close()
@@ -1,23 +1,187 @@
 """画像生成のコアロジック（text-to-image & image-to-image対応）"""
 import os
+import asyncio
+import glob
+import hashlib
+import threading
 import fal_client
+from concurrent.futures import Future
+from io import BytesIO
 from datetime import datetime
+from .submission_engine import SubmissionEngine
+from .job_journal import JobJournal
+from .upload_cache import UploadCache
+from .result_cache import ResultCache
+from ..utils.image_prep import prepare_input_image
 
 class ImageGenerator:
-    def __init__(self, output_dir="generated_images"):
+    def __init__(self, output_dir="generated_images", max_in_flight=4, poll_interval=0.5,
+                 journal_file=None, client_factory=None, upload_cache_file=None,
+                 model_manager=None, input_options=None, result_cache_max_bytes=None,
+                 max_save_attempts=3):
         self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
+        
+        # キューAPIで複数ジョブを同時に処理するエンジン
+        self.engine = SubmissionEngine(max_in_flight=max_in_flight, poll_interval=poll_interval,
+                                       client_factory=client_factory)
+        
+        # 保存処理中のファイル名（バックグラウンド保存との衝突防止）
+        self._reserved_filenames = set()
+        self._filename_lock = threading.Lock()
+        
+        # クラッシュ後に再開するためのジョブジャーナル（任意）
+        self.journal = JobJournal(journal_file) if journal_file else None
+        self.max_save_attempts = max_save_attempts
+        
+        # 入力画像のアップロードURLキャッシュ（同じ画像を再アップロードしない）
+        self.upload_cache = UploadCache(upload_cache_file) if upload_cache_file else None
+        
+        # 入力画像の前処理設定（モデルの作業解像度への縮小・再圧縮）
+        self.model_manager = model_manager
+        self.input_options = {"enabled": True, "format": "JPEG", "quality": 90, **(input_options or {})}
+        
+        # シード固定リクエストの結果キャッシュ（Noneで無効）
+        self.result_cache = None
+        if result_cache_max_bytes is not None:
+            self.result_cache = ResultCache(os.path.join(self.output_dir, ".result_cache"), result_cache_max_bytes)
     
-    def generate(self, api_key, model_endpoint, generation_params):
-        """画像を生成"""
+    def submit(self, api_key, model_endpoint, generation_params, on_status=None,
+               source_image=None, meta=None, job_id=None, use_cache=True):
+        """画像生成ジョブを投入（結果はFutureで返る）
+        
+        source_imageを指定するとアップロード後にimage_urlを設定してから投入する。
+        戻り値のFutureにはジャーナル上のjob_id属性と結果キャッシュのcache_key属性が付く。
+        シード固定でキャッシュにヒットした場合はAPIを呼ばずに完了済みのFutureを返す
+        （結果の各画像はurlの代わりにpathを持ち、"cached": True が付く）。
+        """
         os.environ["FAL_KEY"] = api_key
         
+        cache_key = self.get_cache_key(model_endpoint, generation_params, source_image) if use_cache else None
+        if cache_key:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                future = Future()
+                future.set_result({"success": True, "data": cached, "request_id": None, "cached": True})
+                future.job_id = None
+                future.cache_key = cache_key
+                return future
+        
+        if self.journal and job_id is None:
+            job_id = self.journal.create_job(model_endpoint, generation_params, source_image, meta)
+        
+        arguments = generation_params
+        if source_image:
+            arguments = lambda: self.prepare_image_to_image_params(generation_params, source_image, model_endpoint)
+        
+        on_submit = None
+        if self.journal:
+            on_submit = lambda request_id: self.journal.mark_submitted(job_id, request_id)
+        
+        future = self.engine.submit(api_key, model_endpoint, arguments, on_status, on_submit)
+        future.cache_key = cache_key
+        return self._track_job(future, job_id)
+    
+    def get_cache_key(self, model_endpoint, generation_params, source_image=None):
+        """結果キャッシュのキーを取得（キャッシュ無効・シード未指定ならNone）"""
+        if not self.result_cache:
+            return None
+        try:
+            return self.result_cache.make_key(model_endpoint, generation_params, source_image)
+        except Exception:
+            return None
+    
+    def store_cached_result(self, cache_key, filepaths, data):
+        """保存済みの結果を結果キャッシュに登録"""
+        if not self.result_cache or not cache_key:
+            return
         try:
-            result = fal_client.subscribe(model_endpoint, arguments=generation_params)
-            return {"success": True, "data": result}
+            self.result_cache.put(cache_key, filepaths, data)
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            print(f"結果キャッシュ保存エラー: {e}")
+    
+    def prepare_image_to_image_params(self, generation_params, source_image, model_endpoint=None):
+        """入力画像をアップロードしてimage_urlを設定"""
+        max_pixels = None
+        if self.model_manager and model_endpoint:
+            max_pixels = self.model_manager.get_input_max_pixels(model_endpoint)
+        
+        upload_result = self.upload_image_to_fal_sync(source_image, max_pixels)
+        if not upload_result["success"]:
+            raise RuntimeError(upload_result["error"])
+        return {**generation_params, "image_url": upload_result["url"]}
+    
+    def resume_jobs(self, api_key, on_status=None):
+        """ジャーナルに残った未完了ジョブを再開し、(ジョブ情報, Future)のリストを返す"""
+        if not self.journal:
+            return []
+        
+        os.environ["FAL_KEY"] = api_key
+        resumed = []
+        for job in self.journal.get_unfinished_jobs():
+            job_id = job["job_id"]
+            state = job["state"]
+            
+            if state == "completed":
+                # 結果取得済み・保存前に終了した場合は保存済みの結果を使う
+                future = Future()
+                future.set_result({"success": True, "data": job["data"], "request_id": job.get("request_id")})
+                future = self._track_job(future, job_id)
+            elif state == "submitted":
+                # リモートで実行中のジョブに再接続（再課金なし）
+                future = self.engine.resume(api_key, job["endpoint"], job["request_id"], on_status)
+                future = self._track_job(future, job_id)
+            else:
+                future = self.submit(api_key, job["endpoint"], job["params"], on_status,
+                                     source_image=job.get("source_image"), job_id=job_id)
+            resumed.append((job, future))
+        return resumed
+    
+    def mark_job_done(self, job_id):
+        """結果の保存完了をジャーナルに記録"""
+        if self.journal and job_id:
+            self.journal.mark_done(job_id)
+    
+    def mark_job_save_failed(self, job_id, error):
+        """結果の保存失敗をジャーナルに記録 - 戻り値: 次回起動時に再開される場合True"""
+        if not self.journal or not job_id:
+            return False
+        return self.journal.mark_save_failed(job_id, error, self.max_save_attempts)
+    
+    def _track_job(self, future, job_id):
+        """Futureにjob_idを付与し、完了時の状態をジャーナルに記録"""
+        future.job_id = job_id
+        if not self.journal or not job_id:
+            return future
+        
+        def record(f):
+            try:
+                result = f.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            
+            if result["success"]:
+                self.journal.mark_completed(job_id, result["data"])
+            else:
+                self.journal.mark_failed(job_id, result["error"])
+        
+        future.add_done_callback(record)
+        return future
+    
+    def generate(self, api_key, model_endpoint, generation_params):
+        """画像を生成（完了まで待機）"""
+        future = self.submit(api_key, model_endpoint, generation_params)
+        result = future.result()
+        # 同期呼び出しは呼び出し元が結果を受け取るため再開対象にしない
+        self.mark_job_done(future.job_id)
+        return result
+    
+    def shutdown(self):
+        """投入エンジンを停止"""
+        self.engine.shutdown()
+        if self.result_cache:
+            self.result_cache.flush()
     
     def build_text_to_image_params(self, prompt, negative_prompt, num_inference_steps, 
                                   guidance_scale, num_images, enable_safety_checker, 
@@ -77,51 +241,112 @@ class ImageGenerator:
         
         return params
     
-    async def upload_image_to_fal(self, image_path):
-        """画像をfal.aiストレージにアップロード"""
+    def read_upload_data(self, image_path_or_pil):
+        """アップロードするバイト列とContent-Typeを取得（パスまたはPILイメージ）"""
+        if hasattr(image_path_or_pil, 'save'):  # PIL Image オブジェクト
+            buffer = BytesIO()
+            image_path_or_pil.save(buffer, format="PNG")
+            return buffer.getvalue(), "image/png", "upload.png"
+        
+        with open(image_path_or_pil, 'rb') as f:
+            data = f.read()
+        
+        # MIMEタイプを推定
+        ext = os.path.splitext(image_path_or_pil)[1].lower()
+        mime_types = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.gif': 'gif', '.webp': 'webp'}
+        mime_type = mime_types.get(ext, 'png')
+        return data, f"image/{mime_type}", os.path.basename(image_path_or_pil)
+    
+    def get_upload_key(self, data, max_pixels=None):
+        """アップロードURLキャッシュのキー（元画像の内容と前処理設定から作成）"""
+        options = self.input_options
+        if options["enabled"]:
+            prep_key = f"|{max_pixels}|{options['format']}|{options['quality']}".encode()
+        else:
+            prep_key = b""
+        return hashlib.sha256(data + prep_key).hexdigest()
+    
+    def prepare_upload_data(self, data, content_type, file_name, max_pixels=None):
+        """前処理が有効ならmax_pixelsまで縮小・再圧縮 - 戻り値: (データ, Content-Type, ファイル名)"""
+        options = self.input_options
+        if not options["enabled"]:
+            return data, content_type, file_name
+        data, content_type, extension = prepare_input_image(
+            data, max_pixels, options["format"], options["quality"]
+        )
+        return data, content_type, os.path.splitext(file_name)[0] + extension
+    
+    async def upload_image_to_fal(self, image_path_or_pil, max_pixels=None):
+        """画像をfal.aiストレージに非同期アップロード（前処理・キャッシュは同期版と共通）"""
         try:
-            with open(image_path, 'rb') as f:
-                file_data = f.read()
+            data, content_type, file_name = await asyncio.to_thread(self.read_upload_data, image_path_or_pil)
+            content_hash = self.get_upload_key(data, max_pixels)
+            
+            if self.upload_cache:
+                cached_url = self.upload_cache.get(content_hash)
+                if cached_url:
+                    return {"success": True, "url": cached_url, "cached": True}
             
-            # fal.aiのストレージにアップロード
-            url = await fal_client.upload_file(file_data)
-            return {"success": True, "url": url}
+            # 縮小・再圧縮はイベントループを止めないようスレッドで実行
+            data, content_type, file_name = await asyncio.to_thread(
+                self.prepare_upload_data, data, content_type, file_name, max_pixels
+            )
+            url = await fal_client.upload_async(data, content_type, file_name)
+            if self.upload_cache:
+                self.upload_cache.put(content_hash, url)
+            return {"success": True, "url": url, "cached": False}
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return {"success": False, "error": f"画像アップロードエラー: {str(e)}"}
     
-    def upload_image_to_fal_sync(self, image_path_or_pil):
-        """画像をfal.aiストレージに同期アップロード（パスまたはPILイメージ）"""
+    def upload_image_to_fal_sync(self, image_path_or_pil, max_pixels=None):
+        """画像をfal.aiストレージに同期アップロード（パスまたはPILイメージ）
+        
+        base64のdata URLではなくバイナリでアップロードし、同じ内容の画像は
+        キャッシュ済みのURLを再利用する。前処理が有効な場合はmax_pixelsまで
+        縮小・再圧縮してから送信する（キャッシュは元画像と前処理設定で参照）。
+        """
         try:
-            # PILイメージの場合は一時ファイルとして保存
-            if hasattr(image_path_or_pil, 'save'):  # PIL Image オブジェクト
-                import tempfile
-                temp_dir = tempfile.gettempdir()
-                temp_path = os.path.join(temp_dir, "temp_upload_image.png")
-                image_path_or_pil.save(temp_path)
-                image_path = temp_path
-            else:
-                image_path = image_path_or_pil
+            data, content_type, file_name = self.read_upload_data(image_path_or_pil)
+            content_hash = self.get_upload_key(data, max_pixels)
             
-            # Base64エンコード
-            import base64
-            with open(image_path, 'rb') as f:
-                image_data = base64.b64encode(f.read()).decode()
+            if self.upload_cache:
+                cached_url = self.upload_cache.get(content_hash)
+                if cached_url:
+                    return {"success": True, "url": cached_url, "cached": True}
             
-            # MIMEタイプを推定
-            ext = os.path.splitext(image_path)[1].lower()
-            mime_types = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.gif': 'gif', '.webp': 'webp'}
-            mime_type = mime_types.get(ext, 'png')
-            
-            data_url = f"data:image/{mime_type};base64,{image_data}"
-            return {"success": True, "url": data_url}
+            data, content_type, file_name = self.prepare_upload_data(data, content_type, file_name, max_pixels)
+            url = fal_client.upload(data, content_type, file_name)
+            if self.upload_cache:
+                self.upload_cache.put(content_hash, url)
+            return {"success": True, "url": url, "cached": False}
             
         except Exception as e:
             return {"success": False, "error": f"画像アップロードエラー: {str(e)}"}
+    
     def generate_filename(self, index=0, mode="text-to-image"):
         """ファイル名を生成"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         prefix = "txt2img" if mode == "text-to-image" else "img2img"
-        return f"{prefix}_{timestamp}_{index+1}.png"
+        stem = f"{prefix}_{timestamp}_{index+1}"
+        
+        # 同じ秒に複数ジョブが完了した場合の上書きを防止（保存前の予約分も考慮）
+        # 保存時に拡張子が形式に合わせて変わるため、拡張子を除いた名前で比較する
+        with self._filename_lock:
+            counter = 2
+            while stem in self._reserved_filenames or self._stem_exists(stem):
+                stem = f"{prefix}_{timestamp}_{index+1}_{counter}"
+                counter += 1
+            self._reserved_filenames.add(stem)
+        return f"{stem}.png"
+    
+    def _stem_exists(self, stem):
+        """拡張子を問わず同じ名前のファイルが出力ディレクトリにあるか"""
+        return bool(glob.glob(os.path.join(glob.escape(self.output_dir), glob.escape(stem) + ".*")))
+    
+    def release_filenames(self, filenames):
+        """保存が終わった（または失敗した）ファイル名の予約を解除"""
+        with self._filename_lock:
+            self._reserved_filenames.difference_update(os.path.splitext(name)[0] for name in filenames)
     
     def get_output_dir(self):
         """出力ディレクトリを取得"""
@@ -0,0 +1,100 @@
+"""生成ジョブの永続キュー（追記型JSONLジャーナル）"""
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+class JobJournal:
+    # 再開対象となる未完了状態
+    UNFINISHED_STATES = ("queued", "submitted", "completed")
+
+    def __init__(self, journal_file="generation_jobs.jsonl"):
+        self.journal_file = journal_file
+        self._lock = threading.Lock()
+        self.jobs = self.load_jobs()
+        self.compact()
+
+    def load_jobs(self):
+        """ジャーナルを再生してジョブごとの最新状態を復元"""
+        jobs = {}
+        if not os.path.exists(self.journal_file):
+            return jobs
+
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # クラッシュ時の書きかけ行は無視
+                    continue
+                job = jobs.setdefault(record["job_id"], {})
+                job.update(record)
+        return jobs
+
+    def compact(self):
+        """完了済みジョブを除いてジャーナルを書き直す（アトミック）"""
+        with self._lock:
+            self.jobs = {job_id: job for job_id, job in self.jobs.items()
+                         if job.get("state") in self.UNFINISHED_STATES}
+            temp_file = f"{self.journal_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                for job in self.jobs.values():
+                    f.write(json.dumps(job, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.journal_file)
+
+    def record(self, job_id, state, **fields):
+        """状態遷移を1行追記"""
+        record = {"job_id": job_id, "state": state, "timestamp": datetime.now().isoformat(), **fields}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.jobs.setdefault(job_id, {}).update(record)
+
+    def create_job(self, endpoint, params, source_image=None, meta=None):
+        """新規ジョブを登録してIDを返す"""
+        job_id = uuid.uuid4().hex
+        self.record(job_id, "queued", endpoint=endpoint, params=params,
+                    source_image=source_image, meta=meta or {})
+        return job_id
+
+    def mark_submitted(self, job_id, request_id):
+        """リモートのリクエストIDを記録"""
+        self.record(job_id, "submitted", request_id=request_id)
+
+    def mark_completed(self, job_id, data):
+        """取得した結果を記録（保存前のクラッシュに備える）"""
+        self.record(job_id, "completed", data=data)
+
+    def mark_failed(self, job_id, error):
+        """失敗を記録"""
+        self.record(job_id, "failed", error=error)
+
+    def mark_save_failed(self, job_id, error, max_attempts=3):
+        """結果の保存失敗を記録 - 戻り値: 再開対象に残る場合True（max_attempts回で打ち切り）"""
+        with self._lock:
+            attempts = self.jobs.get(job_id, {}).get("save_attempts", 0) + 1
+        if attempts >= max_attempts:
+            self.record(job_id, "failed", error=error, save_attempts=attempts)
+            return False
+        # 取得済みの結果は残したまま、次回起動時に保存し直す
+        self.record(job_id, "completed", save_error=error, save_attempts=attempts)
+        return True
+
+    def mark_done(self, job_id):
+        """結果の保存まで完了したことを記録"""
+        self.record(job_id, "done")
+
+    def get_unfinished_jobs(self):
+        """再開が必要なジョブのリストを取得"""
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()
+                    if job.get("state") in self.UNFINISHED_STATES]
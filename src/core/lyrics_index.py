@@ -0,0 +1,96 @@
+"""歌詞ファイルの探索（os.scandirの1パス＋ディレクトリ更新時刻で再利用する永続インデックス）"""
+import json
+import os
+import threading
+
+SONG_TYPES = ("opening", "ending")
+
+def scan_lyrics_directory(lyrics_dir):
+    """ディレクトリを1回だけ走査 - 戻り値: ({種別: (作成時刻, ファイル名) or None}, サブディレクトリ名のリスト)"""
+    latest = {song_type: None for song_type in SONG_TYPES}
+    subdirs = []
+    with os.scandir(lyrics_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(name)
+                continue
+            if not name.endswith(".json"):
+                continue
+            for song_type in SONG_TYPES:
+                if name.startswith(f"lyrics_{song_type}_"):
+                    # ソートせず最大値だけを保持（statはDirEntryのキャッシュを利用）
+                    ctime = entry.stat().st_ctime
+                    if latest[song_type] is None or (ctime, name) > tuple(latest[song_type]):
+                        latest[song_type] = (ctime, name)
+                    break
+    return latest, subdirs
+
+class LyricsIndex:
+    def __init__(self, index_file=None):
+        # index_fileがNoneなら毎回走査（永続化しない）
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self.entries = self.load_index() if index_file else {}
+
+    def load_index(self):
+        """インデックスを読み込み"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_index(self):
+        """インデックスをアトミックに保存"""
+        if not self.index_file:
+            return
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(temp_file, self.index_file)
+
+    def scan(self, lyrics_dir):
+        """ディレクトリの内容を取得（更新時刻が前回と同じなら走査しない）"""
+        key = os.path.abspath(lyrics_dir)
+        mtime = os.stat(lyrics_dir).st_mtime
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry
+
+        latest, subdirs = scan_lyrics_directory(lyrics_dir)
+        entry = {"mtime": mtime, "subdirs": subdirs, **latest}
+        if self.index_file:
+            with self._lock:
+                self.entries[key] = entry
+        return entry
+
+    def find_directories(self, base_dir):
+        """オープニングとエンディングが揃ったディレクトリを列挙 - 戻り値: [(ディレクトリ, オープニング, エンディング)]"""
+        found = []
+        visited = set()
+        stack = [base_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                entry = self.scan(current)
+            except OSError:
+                continue
+            visited.add(os.path.abspath(current))
+
+            if entry["opening"] and entry["ending"]:
+                found.append((current,
+                              os.path.join(current, entry["opening"][1]),
+                              os.path.join(current, entry["ending"][1])))
+            # 名前順に深さ優先で辿る
+            stack.extend(os.path.join(current, name) for name in sorted(entry["subdirs"], reverse=True))
+
+        if self.index_file:
+            # 消えたディレクトリを除いて保存
+            base_key = os.path.abspath(base_dir)
+            with self._lock:
+                self.entries = {key: value for key, value in self.entries.items()
+                                if key in visited or not (key == base_key or key.startswith(base_key + os.sep))}
+                self.save_index()
+        return found
@@ -0,0 +1,78 @@
+"""歌詞ディレクトリごとの処理済みマニフェスト（元ファイルのハッシュ→生成物）"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+class LyricsManifest:
+    def __init__(self, manifest_file, base_dir):
+        self.manifest_file = manifest_file
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self.entries = self.load_manifest()
+
+    def load_manifest(self):
+        """マニフェストを読み込み"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_manifest(self):
+        """マニフェストをアトミックに保存"""
+        temp_file = f"{self.manifest_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.manifest_file)
+
+    def make_key(self, lyrics_dir):
+        """ベースディレクトリからの相対パス（マウント先が変わっても同じキー）"""
+        return os.path.relpath(os.path.abspath(lyrics_dir), os.path.abspath(self.base_dir))
+
+    def describe_source(self, file_path, previous=None):
+        """元ファイルの情報（サイズ・更新時刻が前回と同じならハッシュを再計算しない）"""
+        stat = os.stat(file_path)
+        info = {"file": os.path.basename(file_path), "size": stat.st_size, "mtime": stat.st_mtime}
+        if (previous and previous.get("file") == info["file"]
+                and previous.get("size") == info["size"] and previous.get("mtime") == info["mtime"]):
+            info["sha256"] = previous["sha256"]
+            return info
+
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                sha256.update(chunk)
+        info["sha256"] = sha256.hexdigest()
+        return info
+
+    def describe_sources(self, lyrics_dir, source_files):
+        """{種別: 元ファイルパス} から比較用の情報を作成"""
+        with self._lock:
+            previous = self.entries.get(self.make_key(lyrics_dir), {}).get("sources", {})
+        return {song_type: self.describe_source(path, previous.get(song_type))
+                for song_type, path in source_files.items()}
+
+    def is_up_to_date(self, lyrics_dir, sources):
+        """元ファイルが前回と同じ内容で、生成物がすべて残っていればTrue"""
+        with self._lock:
+            entry = self.entries.get(self.make_key(lyrics_dir))
+        if not entry:
+            return False
+
+        if any(entry["sources"].get(song_type, {}).get("sha256") != info["sha256"]
+               for song_type, info in sources.items()):
+            return False
+
+        return all(os.path.exists(os.path.join(lyrics_dir, output)) for output in entry["outputs"])
+
+    def record(self, lyrics_dir, sources, outputs):
+        """処理結果を登録（outputsはディレクトリからの相対パス）"""
+        with self._lock:
+            self.entries[self.make_key(lyrics_dir)] = {
+                "sources": sources,
+                "outputs": outputs,
+                "processed_at": time.time()
+            }
+            self.save_manifest()
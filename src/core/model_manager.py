@@ -45,16 +45,36 @@ class ModelManager:
         
         # image-to-imageパラメータ
         self.image_to_image_parameters = {
-            "fal-ai/flux/dev/image-to-image": {"max_inference_steps": 40, "default_inference_steps": 40, "default_guidance_scale": 3.5, "default_strength": 0.95, "default_safety_checker": True},
-            "fal-ai/flux/schnell/image-to-image": {"max_inference_steps": 4, "default_inference_steps": 4, "default_guidance_scale": 3.5, "default_strength": 0.95, "default_safety_checker": True},
-            "fal-ai/flux-pro/kontext": {"max_inference_steps": 25, "default_inference_steps": 25, "default_guidance_scale": 3.5, "default_strength": 0.8, "default_safety_checker": True},
-            "fal-ai/flux-lora/image-to-image": {"max_inference_steps": 28, "default_inference_steps": 28, "default_guidance_scale": 3.5, "default_strength": 0.95, "default_safety_checker": True},
-            "fal-ai/fast-sdxl/image-to-image": {"max_inference_steps": 25, "default_inference_steps": 25, "default_guidance_scale": 7.5, "default_strength": 0.95, "default_safety_checker": True},
-            "fal-ai/photomaker": {"max_inference_steps": 50, "default_inference_steps": 50, "default_guidance_scale": 5.0, "default_strength": 1.0, "default_safety_checker": True}
+            "fal-ai/flux/dev/image-to-image": {"max_inference_steps": 40, "default_inference_steps": 40, "default_guidance_scale": 3.5, "default_strength": 0.95, "default_safety_checker": True, "max_input_megapixels": 1.0},
+            "fal-ai/flux/schnell/image-to-image": {"max_inference_steps": 4, "default_inference_steps": 4, "default_guidance_scale": 3.5, "default_strength": 0.95, "default_safety_checker": True, "max_input_megapixels": 1.0},
+            "fal-ai/flux-pro/kontext": {"max_inference_steps": 25, "default_inference_steps": 25, "default_guidance_scale": 3.5, "default_strength": 0.8, "default_safety_checker": True, "max_input_megapixels": 1.0},
+            "fal-ai/flux-lora/image-to-image": {"max_inference_steps": 28, "default_inference_steps": 28, "default_guidance_scale": 3.5, "default_strength": 0.95, "default_safety_checker": True, "max_input_megapixels": 1.0},
+            "fal-ai/fast-sdxl/image-to-image": {"max_inference_steps": 25, "default_inference_steps": 25, "default_guidance_scale": 7.5, "default_strength": 0.95, "default_safety_checker": True, "max_input_megapixels": 1.0},
+            "fal-ai/photomaker": {"max_inference_steps": 50, "default_inference_steps": 50, "default_guidance_scale": 5.0, "default_strength": 1.0, "default_safety_checker": True, "max_input_megapixels": 1.0}
         }
         
         # 統合パラメータリスト
         self.model_parameters = {**self.text_to_image_parameters, **self.image_to_image_parameters}
+        
+        # 1枚あたりの推定コスト（USD、目安。設定の estimated_cost_per_image で上書き可能）
+        self.estimated_cost_per_image = {
+            "fal-ai/flux/dev": 0.025,
+            "fal-ai/flux/schnell": 0.003,
+            "fal-ai/flux-pro/v1.1": 0.04,
+            "fal-ai/flux-pro/v1.1-ultra": 0.06,
+            "fal-ai/recraft-v3": 0.04,
+            "fal-ai/stable-diffusion-v35-large": 0.065,
+            "fal-ai/ideogram/v3": 0.06,
+            "fal-ai/flux-lora": 0.035,
+            "fal-ai/fast-sdxl": 0.003,
+            "fal-ai/qwen-image": 0.02,
+            "fal-ai/flux/dev/image-to-image": 0.03,
+            "fal-ai/flux/schnell/image-to-image": 0.003,
+            "fal-ai/flux-pro/kontext": 0.04,
+            "fal-ai/flux-lora/image-to-image": 0.035,
+            "fal-ai/fast-sdxl/image-to-image": 0.003,
+            "fal-ai/photomaker": 0.04
+        }
     
     def get_models_by_type(self, model_type):
         """タイプ別のモデルを取得"""
@@ -90,6 +110,18 @@ class ModelManager:
             "default_safety_checker": True
         })
     
+    def estimate_cost(self, endpoint, num_images=1, overrides=None):
+        """生成コストの推定値（USD）- overridesは {エンドポイント: 1枚あたりの金額}"""
+        cost_per_image = (overrides or {}).get(endpoint, self.estimated_cost_per_image.get(endpoint, 0.0))
+        return cost_per_image * num_images
+    
+    def get_input_max_pixels(self, endpoint):
+        """image-to-image入力の最大ピクセル数（モデルの作業解像度）を取得"""
+        megapixels = self.get_model_parameters(endpoint).get("max_input_megapixels")
+        if not megapixels:
+            return None
+        return int(megapixels * 1024 * 1024)
+    
     def get_model_names(self, model_type=None):
         """利用可能なモデル名のリストを取得"""
         if model_type:
@@ -0,0 +1,128 @@
+"""決定的なリクエスト（シード固定）の結果キャッシュ（コンテンツアドレス・LRU）"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 参照時刻だけが変わった未保存の状態（次の書き込みか終了時に保存）
+        self._dirty = False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self):
+        """インデックスを読み込み"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_index(self):
+        """インデックスをアトミックに保存"""
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(temp_file, self.index_file)
+        self._dirty = False
+
+    def flush(self):
+        """未保存の参照時刻をインデックスに書き込む"""
+        with self._lock:
+            if self._dirty:
+                self.save_index()
+
+    def make_key(self, endpoint, params, source_image=None):
+        """エンドポイント＋パラメータの正規化ハッシュ（シード未指定ならNone＝キャッシュ対象外）"""
+        if params.get("seed") is None:
+            return None
+
+        payload = {"endpoint": endpoint, "params": params}
+        if source_image:
+            # 入力画像はパスではなく内容で区別
+            with open(source_image, 'rb') as f:
+                payload["source_sha256"] = hashlib.sha256(f.read()).hexdigest()
+
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """キャッシュ済みの結果を取得 - 戻り値: 生成結果と同じ形式の辞書（画像はpathを持つ）"""
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+
+            paths = [os.path.join(self.cache_dir, name) for name in entry["files"]]
+            if not all(os.path.exists(path) for path in paths):
+                self._remove(key)
+                self.save_index()
+                return None
+
+            # 参照のたびにインデックス全体を書き直さない
+            entry["last_access"] = time.time()
+            self._dirty = True
+
+            data = dict(entry["data"])
+            data["images"] = [{**image, "path": path, "url": None}
+                              for image, path in zip(entry["data"]["images"], paths)]
+            return data
+
+    def put(self, key, filepaths, data):
+        """保存済みの結果ファイルを登録（ハードリンク、不可ならコピー）"""
+        if key is None:
+            return
+
+        with self._lock:
+            names = []
+            total_size = 0
+            for i, filepath in enumerate(filepaths):
+                name = f"{key}_{i}{os.path.splitext(filepath)[1]}"
+                cached_path = os.path.join(self.cache_dir, name)
+                if not os.path.exists(cached_path):
+                    try:
+                        os.link(filepath, cached_path)
+                    except OSError:
+                        shutil.copyfile(filepath, cached_path)
+                names.append(name)
+                total_size += os.path.getsize(cached_path)
+
+            images = [{k: v for k, v in image.items() if k not in ("url", "path")}
+                      for image in data.get("images", [])]
+            self.index[key] = {
+                "files": names,
+                "size": total_size,
+                "last_access": time.time(),
+                "data": {**data, "images": images}
+            }
+            self._evict()
+            self.save_index()
+
+    def _evict(self):
+        """合計サイズが上限を超えた分を古い順に削除"""
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]["size"]
+            self._remove(key)
+
+    def _remove(self, key):
+        """エントリとキャッシュファイルを削除"""
+        entry = self.index.pop(key, None)
+        if entry is None:
+            return
+        for name in entry["files"]:
+            path = os.path.join(self.cache_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,124 @@
+"""非同期ジョブ投入エンジン（fal.aiキューAPI: submit / status / result）"""
+import asyncio
+import threading
+import time
+import fal_client
+
+class SubmissionEngine:
+    def __init__(self, max_in_flight=4, poll_interval=0.5, client_factory=None):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.poll_interval = poll_interval
+        # APIキーごとにクライアントを生成（テスト・ベンチマーク用に差し替え可能）
+        self.client_factory = client_factory or (lambda api_key: fal_client.AsyncClient(key=api_key))
+        self._clients = {}
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """イベントループ用のバックグラウンドスレッドを起動"""
+        with self._lock:
+            if self._loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_in_flight)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="SubmissionEngine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+
+    def shutdown(self, timeout=2.0):
+        """イベントループを停止"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+            self._clients = {}
+
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+    def submit(self, api_key, endpoint, arguments, on_status=None, on_submit=None):
+        """ジョブを投入し、結果を受け取るconcurrent.futures.Futureを返す
+
+        argumentsには辞書の他、引数を返す呼び出し可能オブジェクト（アップロード等の
+        準備処理）も渡せる。準備処理はエグゼキューター上で実行される。
+        on_submitはリモートのrequest_idが確定した時点で呼ばれる。
+        Futureの結果は {"success": bool, "data"/"error": ..., "request_id": str} 形式。
+        成功時は投入受付から結果受信までの秒数 "latency" が付く（待ち行列・アップロード待ちは含まない）。
+        """
+        self.start()
+        coro = self._run_job(api_key, endpoint, arguments, on_status, on_submit)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def resume(self, api_key, endpoint, request_id, on_status=None):
+        """投入済みのリモートジョブに再接続し、結果を受け取るFutureを返す"""
+        self.start()
+        coro = self._resume_job(api_key, endpoint, request_id, on_status)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _get_client(self, api_key):
+        """APIキーに対応するクライアントを取得（接続を使い回す）"""
+        client = self._clients.get(api_key)
+        if client is None:
+            client = self.client_factory(api_key)
+            self._clients[api_key] = client
+        return client
+
+    async def _run_job(self, api_key, endpoint, arguments, on_status, on_submit):
+        """同時実行数の上限内でジョブを実行"""
+        async with self._semaphore:
+            try:
+                if callable(arguments):
+                    loop = asyncio.get_running_loop()
+                    arguments = await loop.run_in_executor(None, arguments)
+
+                client = self._get_client(api_key)
+                handle = await client.submit(endpoint, arguments=arguments)
+                submitted_at = time.monotonic()
+                if on_submit:
+                    on_submit(handle.request_id)
+                result = await self._wait_for_result(handle, on_status)
+                result["latency"] = time.monotonic() - submitted_at
+                return result
+            except Exception as e:
+                # HTTPエラーはステータスコードを付ける（再試行の判定用）
+                return {"success": False, "error": str(e), "status_code": getattr(e, "status_code", None)}
+
+    async def _resume_job(self, api_key, endpoint, request_id, on_status):
+        """既存のrequest_idで結果を待機"""
+        async with self._semaphore:
+            try:
+                handle = await self._get_client(api_key).get_handle(endpoint, request_id)
+                return await self._wait_for_result(handle, on_status)
+            except Exception as e:
+                return {"success": False, "error": str(e), "request_id": request_id,
+                        "status_code": getattr(e, "status_code", None)}
+
+    async def _wait_for_result(self, handle, on_status):
+        """ステータスをポーリングし、完了後に結果を取得"""
+        while True:
+            status = await handle.status()
+            if on_status:
+                try:
+                    on_status(handle.request_id, status)
+                except Exception:
+                    pass
+
+            if isinstance(status, fal_client.Completed):
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        data = await handle.get()
+        return {"success": True, "data": data, "request_id": handle.request_id}
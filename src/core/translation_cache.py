@@ -0,0 +1,100 @@
+"""翻訳結果の永続キャッシュ（正規化した原文・モデル・温度で参照、SQLite）"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# SQLiteのプレースホルダ数上限に収まるよう分割して問い合わせ
+QUERY_CHUNK_SIZE = 500
+
+class TranslationCache:
+    def __init__(self, db_file="translation_cache.db"):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # 複数プロセスから同時に使われても待機できるようにする
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def normalize(text):
+        """全角・半角や前後・連続空白の違いを吸収"""
+        text = unicodedata.normalize("NFKC", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def make_key(self, text, model, temperature):
+        """正規化した原文・モデル・温度のハッシュ"""
+        payload = f"{model}\0{float(temperature)}\0{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts, model, temperature):
+        """複数テキストの翻訳をまとめて取得 - 戻り値: {原文: 翻訳}（未登録は含まない）"""
+        keys = {}
+        for text in texts:
+            keys.setdefault(self.make_key(text, model, temperature), []).append(text)
+
+        found = {}
+        key_list = list(keys)
+        with self._lock:
+            for i in range(0, len(key_list), QUERY_CHUNK_SIZE):
+                chunk = key_list[i:i + QUERY_CHUNK_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, translation in rows:
+                    for text in keys[key]:
+                        found[text] = translation
+
+            self.hits += len(found)
+            self.misses += len(set(texts)) - len(found)
+        return found
+
+    def put_many(self, translations, model, temperature):
+        """翻訳結果をまとめて登録（{原文: 翻訳}）"""
+        now = time.time()
+        rows = [(self.make_key(source, model, temperature), source, model, float(temperature), translation, now)
+                for source, translation in translations.items()]
+        if not rows:
+            return
+
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, source, model, temperature, translation, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+    def get_stats(self):
+        """ヒット・ミス件数と登録件数"""
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "entries": entries
+            }
+
+    def close(self):
+        """接続を閉じる"""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,52 @@
+"""アップロード済み画像URLのキャッシュ（ファイル内容のハッシュで参照）"""
+import json
+import os
+import threading
+import time
+
+class UploadCache:
+    def __init__(self, cache_file="upload_cache.json", ttl_seconds=24 * 60 * 60):
+        self.cache_file = cache_file
+        # fal.aiストレージのURLは期限切れになるため一定時間で再アップロード
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.entries = self.load_cache()
+
+    def load_cache(self):
+        """キャッシュを読み込み（期限切れは除外）"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        now = time.time()
+        return {key: entry for key, entry in entries.items()
+                if now - entry.get("uploaded_at", 0) < self.ttl_seconds}
+
+    def save_cache(self):
+        """キャッシュをアトミックに保存"""
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(temp_file, self.cache_file)
+
+    def get(self, content_hash):
+        """ハッシュに対応するアップロード済みURLを取得"""
+        with self._lock:
+            entry = self.entries.get(content_hash)
+            if entry is None:
+                return None
+            if time.time() - entry["uploaded_at"] >= self.ttl_seconds:
+                del self.entries[content_hash]
+                return None
+            return entry["url"]
+
+    def put(self, content_hash, url):
+        """アップロード結果を登録"""
+        with self._lock:
+            self.entries[content_hash] = {"url": url, "uploaded_at": time.time()}
+            try:
+                self.save_cache()
+            except Exception as e:
+                print(f"アップロードキャッシュ保存エラー: {e}")
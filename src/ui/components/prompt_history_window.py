@@ -1,63 +1,128 @@
 """プロンプト履歴ウィンドウ（修正版）"""
+import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import json
-import os
+from collections import OrderedDict
 from datetime import datetime
+from ...core.history_store import HistoryStore
+from ...core.history_search import HistorySearchIndex
 
 class PromptHistoryWindow:
+    # 検索入力の確定を待つ時間（ミリ秒）
+    SEARCH_DELAY_MS = 250
+    # 検索インデックスの構築完了を確認する間隔（ミリ秒）
+    INDEX_POLL_MS = 100
+    # 表示用に保持するエントリ数（スクロールで見える範囲を読み込む）
+    ROW_CACHE_SIZE = 2000
+    # 並び順（表示名 -> HistoryStoreの並び順キー）
+    SORT_OPTIONS = {
+        "新しい順": "newest",
+        "使用回数順": "most_used",
+        "速い順": "fastest",
+        "安い順": "cheapest"
+    }
+
     def __init__(self, parent, prompt_frame):
         self.parent = parent
         self.prompt_frame = prompt_frame
         self.history_file = "prompt_history.json"
         self.window = None
-        self.history_data = self.load_history()
+        # 履歴はSQLiteに保存（旧JSONは初回のみ取り込み）
+        self.store = HistoryStore("prompt_history.db", legacy_file=self.history_file)
+        # 順位付き検索用のインデックス（初回表示時にバックグラウンドで1回だけ構築し、以降は追加・削除を反映）
+        self.search_index = None
+        self._index_thread = None
+        self._built_index = None
+        # 構築中に行われた変更（構築後に反映）
+        self._index_pending = []
+        
+        # 現在の検索結果（IDのみ保持し、表示する行だけ読み込む）
+        self.current_ids = []
+        self.row_cache = OrderedDict()
+        self.offset = 0
+        self.visible_rows = 0
+        # 選択中のエントリIDと検索結果内の位置（リストを走査せずに参照する）
+        self.selected_id = None
+        self.selected_index = None
+        self._search_after_id = None
+        self._rendering = False
+    
+    def add_to_history(self, prompt, negative_prompt=""):
+        """履歴にプロンプトを追加（既存の場合は日時だけ更新）"""
+        if not prompt.strip():
+            return
         
-    def load_history(self):
-        """履歴データを読み込み"""
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {"prompts": []}
-        except Exception:
-            return {"prompts": []}
+            entry_id = self.store.add(prompt, negative_prompt)
+            self.row_cache.pop(entry_id, None)
+            self.update_search_index("add", entry_id)
+        except Exception as e:
+            print(f"履歴保存エラー: {e}")
     
-    def save_history(self):
-        """履歴データを保存"""
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history_data, f, indent=2, ensure_ascii=False)
-        except Exception:
-            pass
+    def update_search_index(self, action, entry_id=None):
+        """検索インデックスに追加・削除・全削除を反映（構築中なら構築後に反映）"""
+        if self.search_index is None:
+            if self._index_thread is not None:
+                self._index_pending.append((action, entry_id))
+            return
+        
+        if action == "add":
+            entry = self.store.get(entry_id)
+            if entry:
+                self.search_index.add(entry)
+        elif action == "remove":
+            self.search_index.remove(entry_id)
+        elif action == "clear":
+            self.search_index.clear()
     
-    def add_to_history(self, prompt, negative_prompt=""):
-        """履歴にプロンプトを追加"""
-        if not prompt.strip():
+    def start_index_build(self):
+        """検索インデックスをバックグラウンドで構築（Tkスレッドを止めない）"""
+        if self.search_index is not None or self._index_thread is not None:
             return
-            
-        # 重複チェック
-        for item in self.history_data["prompts"]:
-            if item["prompt"] == prompt and item.get("negative_prompt", "") == negative_prompt:
-                # 既存の場合は時間だけ更新
-                item["timestamp"] = datetime.now().isoformat()
-                self.save_history()
-                return
-        
-        # 新規追加
-        entry = {
-            "prompt": prompt,
-            "negative_prompt": negative_prompt,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        self.history_data["prompts"].insert(0, entry)  # 最新を先頭に
-        
-        # 最大100件まで保持
-        if len(self.history_data["prompts"]) > 100:
-            self.history_data["prompts"] = self.history_data["prompts"][:100]
-        
-        self.save_history()
+        
+        def build():
+            try:
+                index = HistorySearchIndex()
+                index.build(self.store.all_entries())
+                self._built_index = index
+            except Exception as e:
+                print(f"検索インデックス構築エラー: {e}")
+        
+        self._index_thread = threading.Thread(target=build, name="HistorySearchIndex", daemon=True)
+        self._index_thread.start()
+        self.parent.after(self.INDEX_POLL_MS, self.check_index_build)
+    
+    def check_index_build(self):
+        """構築完了を確認し、完了していれば切り替えて検索し直す（Tkスレッド）"""
+        if self._index_thread.is_alive():
+            self.parent.after(self.INDEX_POLL_MS, self.check_index_build)
+            return
+        
+        self._index_thread = None
+        if self._built_index is None:
+            # 構築に失敗した場合は次回表示時に再試行
+            self._index_pending = []
+            return
+        
+        self.search_index, self._built_index = self._built_index, None
+        pending, self._index_pending = self._index_pending, []
+        for action, entry_id in pending:
+            self.update_search_index(action, entry_id)
+        
+        if self.window and self.window.winfo_exists() and self.search_var.get().strip():
+            self.on_search()
+    
+    def record_generation(self, prompt, negative_prompt="", **usage):
+        """生成実績を履歴エントリに加算（履歴に無いプロンプトはcreate=Trueの場合のみエントリを作成）"""
+        entry_id = self.store.record_generation(prompt, negative_prompt, **usage)
+        if entry_id is None:
+            return None
+        self.row_cache.pop(entry_id, None)
+        self.update_search_index("add", entry_id)
+        if self.window and self.window.winfo_exists():
+            # 新しく作成されたエントリも一覧に含める
+            self.refresh_list()
+        return entry_id
     
     def show_window(self):
         """履歴ウィンドウを表示"""
@@ -82,38 +147,62 @@ class PromptHistoryWindow:
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=50)
         self.search_entry.pack(side=tk.LEFT, padx=(5, 10))
-        self.search_entry.bind('<KeyRelease>', self.on_search)
+        self.search_entry.bind('<KeyRelease>', self.schedule_search)
         
         ttk.Button(search_frame, text="🔍 検索", command=self.on_search).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(search_frame, text="🔄 リフレッシュ", command=self.refresh_list).pack(side=tk.LEFT)
         
+        ttk.Label(search_frame, text="並び順:").pack(side=tk.LEFT, padx=(10, 0))
+        self.sort_var = tk.StringVar(value="新しい順")
+        sort_combo = ttk.Combobox(search_frame, textvariable=self.sort_var, values=list(self.SORT_OPTIONS),
+                                  state="readonly", width=10)
+        sort_combo.pack(side=tk.LEFT, padx=(5, 0))
+        sort_combo.bind("<<ComboboxSelected>>", self.on_search)
+        
+        self.count_label = ttk.Label(search_frame, text="")
+        self.count_label.pack(side=tk.RIGHT)
+        
         # 履歴リストフレーム
         list_frame = ttk.Frame(main_frame)
         list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
         
-        # Treeview for history list
-        columns = ("date", "prompt", "negative")
-        self.history_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        # Treeview for history list（見えている行数分の項目だけを作り、スクロール時は中身を入れ替える）
+        columns = ("date", "prompt", "negative", "count", "latency")
+        self.history_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15,
+                                         selectmode="browse")
         
         # 列設定
         self.history_tree.heading("date", text="日時")
         self.history_tree.heading("prompt", text="プロンプト")
         self.history_tree.heading("negative", text="ネガティブプロンプト")
+        self.history_tree.heading("count", text="生成回数")
+        self.history_tree.heading("latency", text="平均時間")
         
-        self.history_tree.column("date", width=120, minwidth=100)
-        self.history_tree.column("prompt", width=400, minwidth=200)
-        self.history_tree.column("negative", width=250, minwidth=100)
+        self.history_tree.column("date", width=100, minwidth=90)
+        self.history_tree.column("prompt", width=340, minwidth=200)
+        self.history_tree.column("negative", width=180, minwidth=100)
+        self.history_tree.column("count", width=70, minwidth=60, anchor=tk.E)
+        self.history_tree.column("latency", width=80, minwidth=60, anchor=tk.E)
         
-        # スクロールバー
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.history_tree.yview)
-        self.history_tree.configure(yscrollcommand=scrollbar.set)
+        # スクロールバー（Treeviewではなく表示位置を直接操作）
+        self.scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.on_scrollbar)
         
         self.history_tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar.pack(side="right", fill="y")
         
         # ダブルクリックイベント
         self.history_tree.bind("<Double-1>", self.on_item_select)
         
+        # スクロール・キー操作・サイズ変更
+        self.history_tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.history_tree.bind("<Button-4>", lambda e: self.scroll_rows(-3))
+        self.history_tree.bind("<Button-5>", lambda e: self.scroll_rows(3))
+        self.history_tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.history_tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.history_tree.bind("<Prior>", lambda e: self.move_selection(-max(1, self.visible_rows - 1)))
+        self.history_tree.bind("<Next>", lambda e: self.move_selection(max(1, self.visible_rows - 1)))
+        self.history_tree.bind("<Configure>", self.on_tree_resize)
+        
         # プレビューフレーム
         preview_frame = ttk.LabelFrame(main_frame, text="プレビュー", padding="5")
         preview_frame.pack(fill=tk.X, pady=(0, 10))
@@ -130,6 +219,11 @@ class PromptHistoryWindow:
         self.preview_negative.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(5, 0))
         self.preview_negative.config(state='disabled')  # 修正：readonlyではなくdisabledを使用
         
+        # 生成実績
+        ttk.Label(preview_frame, text="生成実績:").grid(row=2, column=0, sticky=(tk.W, tk.N), pady=2)
+        self.preview_stats = ttk.Label(preview_frame, text="", justify=tk.LEFT)
+        self.preview_stats.grid(row=2, column=1, sticky=tk.W, padx=(5, 0), pady=2)
+        
         preview_frame.columnconfigure(1, weight=1)
         
         # ボタンフレーム
@@ -142,138 +236,312 @@ class PromptHistoryWindow:
         ttk.Button(button_frame, text="🧹 全履歴クリア", command=self.clear_all_history).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="❌ 閉じる", command=self.window.destroy).pack(side=tk.RIGHT)
         
-        # 初期データ読み込み
+        # 初期データ読み込み（検索インデックスは入力中にバックグラウンドで作成）
         self.refresh_list()
+        self.start_index_build()
         
         # 選択変更イベント
         self.history_tree.bind("<<TreeviewSelect>>", self.on_selection_change)
     
     def refresh_list(self):
-        """リストを更新"""
-        self.history_data = self.load_history()
-        self.populate_list()
+        """リストを更新（検索インデックスは追加・削除を反映済みのため作り直さない）"""
+        self.row_cache.clear()
+        self.on_search()
     
-    def populate_list(self, items=None):
-        """リストに項目を追加"""
-        # 既存項目をクリア
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        if items is None:
-            items = self.history_data["prompts"]
+    def schedule_search(self, event=None):
+        """入力が止まってから検索（キー入力のたびに検索しない）"""
+        if self._search_after_id is not None:
+            self.window.after_cancel(self._search_after_id)
+        self._search_after_id = self.window.after(self.SEARCH_DELAY_MS, self.on_search)
+    
+    def search_ids(self, query):
+        """検索条件に一致するエントリIDを表示順に取得（新しい順での検索は関連度順）"""
+        order = self.SORT_OPTIONS.get(self.sort_var.get(), "newest")
+        if not query:
+            return self.store.list_ids(order=order)
+        if self.search_index is None:
+            # 構築完了後に検索し直す
+            self.start_index_build()
+            return None
+        
+        matched_ids = self.search_index.search(query)
+        if order == "newest":
+            return matched_ids
+        # 並び順を指定した場合は一致したエントリを集計値で並べ替え
+        matched = set(matched_ids)
+        return [entry_id for entry_id in self.store.list_ids(order=order) if entry_id in matched]
+    
+    def on_search(self, event=None):
+        """検索処理（結果のIDを保持し、選択時の参照に使う）"""
+        self._search_after_id = None
+        if not (self.window and self.window.winfo_exists()):
+            return
+        query = self.search_var.get().strip()
+        try:
+            current_ids = self.search_ids(query)
+        except Exception as e:
+            print(f"履歴検索エラー: {e}")
+            current_ids = []
         
-        for entry in items:
+        if current_ids is None:
+            self.count_label.config(text="検索インデックス作成中...")
+            return
+        self.current_ids = current_ids
+        
+        self.offset = 0
+        # 同じ位置に同じエントリが残っている場合のみ選択を維持
+        index = self.selected_index
+        if index is None or index >= len(self.current_ids) or self.current_ids[index] != self.selected_id:
+            self.set_selection(None)
+        self.count_label.config(text=f"{len(self.current_ids)}件")
+        self.populate_list()
+    
+    def get_entries(self, entry_ids):
+        """エントリを取得（キャッシュに無い分だけまとめて読み込む）"""
+        missing = [entry_id for entry_id in entry_ids if entry_id not in self.row_cache]
+        if missing:
+            self.row_cache.update(self.store.get_many(missing))
+        
+        entries = []
+        for entry_id in entry_ids:
+            entry = self.row_cache.get(entry_id)
+            if entry is not None:
+                self.row_cache.move_to_end(entry_id)
+            entries.append(entry)
+        
+        while len(self.row_cache) > self.ROW_CACHE_SIZE:
+            self.row_cache.popitem(last=False)
+        return entries
+    
+    def format_row(self, entry):
+        """1行分の表示値を作成"""
+        # 日時フォーマット
+        timestamp = entry.get("timestamp", "")
+        if timestamp:
             try:
-                # 日時フォーマット
-                timestamp = entry.get("timestamp", "")
-                if timestamp:
-                    try:
-                        dt = datetime.fromisoformat(timestamp)
-                        date_str = dt.strftime("%m/%d %H:%M")
-                    except:
-                        date_str = "不明"
-                else:
-                    date_str = "不明"
-                
-                # プロンプト表示（長い場合は省略）
-                prompt = entry.get("prompt", "")
-                prompt_display = prompt[:80] + "..." if len(prompt) > 80 else prompt
-                
-                negative = entry.get("negative_prompt", "")
-                negative_display = negative[:50] + "..." if len(negative) > 50 else negative
-                
-                self.history_tree.insert("", "end", values=(date_str, prompt_display, negative_display))
-            except Exception:
-                continue
+                dt = datetime.fromisoformat(timestamp)
+                date_str = dt.strftime("%m/%d %H:%M")
+            except:
+                date_str = "不明"
+        else:
+            date_str = "不明"
+        
+        # プロンプト表示（長い場合は省略）
+        prompt = entry.get("prompt", "")
+        prompt_display = prompt[:80] + "..." if len(prompt) > 80 else prompt
+        
+        negative = entry.get("negative_prompt", "")
+        negative_display = negative[:50] + "..." if len(negative) > 50 else negative
+        
+        generation_count = entry.get("generation_count") or 0
+        if generation_count:
+            latency_display = f"{entry.get('total_latency', 0.0) / generation_count:.1f}秒"
+        else:
+            latency_display = "-"
+        
+        return (date_str, prompt_display, negative_display, generation_count, latency_display)
     
-    def on_search(self, event=None):
-        """検索処理"""
-        query = self.search_var.get().lower()
-        if not query:
+    def on_tree_resize(self, event=None):
+        """表示できる行数が変わったら行を作り直す"""
+        rowheight = ttk.Style().lookup("Treeview", "rowheight") or 20
+        try:
+            rowheight = int(rowheight)
+        except (TypeError, ValueError):
+            rowheight = 20
+        # 見出し分を除いた高さに収まる行数
+        visible_rows = max(1, (self.history_tree.winfo_height() - rowheight) // rowheight)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
             self.populate_list()
-            return
+    
+    def populate_list(self, items=None):
+        """表示範囲の行だけを描画"""
+        if not self.visible_rows:
+            self.visible_rows = int(self.history_tree.cget("height"))
         
-        filtered_items = []
-        for entry in self.history_data["prompts"]:
-            if (query in entry.get("prompt", "").lower() or 
-                query in entry.get("negative_prompt", "").lower()):
-                filtered_items.append(entry)
+        max_offset = max(0, len(self.current_ids) - self.visible_rows)
+        self.offset = min(max(0, self.offset), max_offset)
+        visible_ids = self.current_ids[self.offset:self.offset + self.visible_rows]
+        entries = self.get_entries(visible_ids)
         
-        self.populate_list(filtered_items)
+        self._rendering = True
+        try:
+            # 行の項目は使い回し、値だけを書き換える
+            for row in range(self.visible_rows):
+                iid = f"row{row}"
+                exists = self.history_tree.exists(iid)
+                if row < len(entries) and entries[row] is not None:
+                    values = self.format_row(entries[row])
+                    if exists:
+                        self.history_tree.item(iid, values=values)
+                        self.history_tree.move(iid, "", row)
+                    else:
+                        self.history_tree.insert("", row, iid=iid, values=values)
+                elif exists:
+                    self.history_tree.delete(iid)
+            
+            # 表示行数が減った場合の余分な行を削除
+            for iid in self.history_tree.get_children():
+                if int(iid[3:]) >= self.visible_rows:
+                    self.history_tree.delete(iid)
+            
+            # 選択中のエントリが表示範囲にあれば選択表示を復元
+            selected_row = None
+            if self.selected_index is not None and 0 <= self.selected_index - self.offset < len(visible_ids):
+                selected_row = f"row{self.selected_index - self.offset}"
+            if selected_row and self.history_tree.exists(selected_row):
+                self.history_tree.selection_set(selected_row)
+            else:
+                self.history_tree.selection_remove(self.history_tree.selection())
+        finally:
+            self._rendering = False
+        
+        self.update_scrollbar()
+    
+    def update_scrollbar(self):
+        """スクロールバーの位置を更新"""
+        total = len(self.current_ids)
+        if total == 0 or total <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible_rows) / total)
+    
+    def on_scrollbar(self, *args):
+        """スクロールバー操作"""
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.current_ids))
+            self.populate_list()
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, self.visible_rows - 1)
+            self.scroll_rows(amount)
+    
+    def on_mousewheel(self, event):
+        """マウスホイールでスクロール"""
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+        return "break"
+    
+    def scroll_rows(self, amount):
+        """指定行数だけスクロール"""
+        self.offset += amount
+        self.populate_list()
+        return "break"
+    
+    def move_selection(self, amount):
+        """キー操作で選択を移動（表示範囲外に出る場合はスクロール）"""
+        if not self.current_ids:
+            return "break"
+        
+        if self.selected_index is not None:
+            index = self.selected_index + amount
+        else:
+            index = self.offset
+        index = min(max(0, index), len(self.current_ids) - 1)
+        self.set_selection(index)
+        
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible_rows:
+            self.offset = index - self.visible_rows + 1
+        self.populate_list()
+        self.show_preview(self.get_selected_entry())
+        return "break"
     
     def on_selection_change(self, event=None):
         """選択変更時のプレビュー更新"""
+        if self._rendering:
+            return
         selection = self.history_tree.selection()
         if not selection:
             return
         
         try:
-            item_index = self.history_tree.index(selection[0])
-            current_items = self.get_current_items()
-            
-            if 0 <= item_index < len(current_items):
-                entry = current_items[item_index]
-                
-                # プレビュー更新 - 修正：正しいstate管理
-                self.preview_prompt.config(state='normal')
-                self.preview_prompt.delete("1.0", tk.END)
-                self.preview_prompt.insert("1.0", entry.get("prompt", ""))
-                self.preview_prompt.config(state='disabled')
-                
-                self.preview_negative.config(state='normal')
-                self.preview_negative.delete("1.0", tk.END)
-                self.preview_negative.insert("1.0", entry.get("negative_prompt", ""))
-                self.preview_negative.config(state='disabled')
+            # 行位置とキャッシュ済みの検索結果から選択エントリを特定
+            index = self.offset + int(selection[0][3:])
+            if 0 <= index < len(self.current_ids):
+                self.set_selection(index)
+                self.show_preview(self.get_selected_entry())
         except Exception:
             pass
     
+    def set_selection(self, index):
+        """選択位置を設定（Noneで選択解除）"""
+        self.selected_index = index
+        self.selected_id = self.current_ids[index] if index is not None else None
+    
+    def show_preview(self, entry):
+        """プレビュー欄を更新"""
+        if entry is None:
+            return
+        
+        # プレビュー更新 - 修正：正しいstate管理
+        self.preview_prompt.config(state='normal')
+        self.preview_prompt.delete("1.0", tk.END)
+        self.preview_prompt.insert("1.0", entry.get("prompt", ""))
+        self.preview_prompt.config(state='disabled')
+        
+        self.preview_negative.config(state='normal')
+        self.preview_negative.delete("1.0", tk.END)
+        self.preview_negative.insert("1.0", entry.get("negative_prompt", ""))
+        self.preview_negative.config(state='disabled')
+        
+        self.preview_stats.config(text=self.format_stats(entry))
+    
+    def format_stats(self, entry):
+        """生成実績の表示文字列を作成"""
+        generation_count = entry.get("generation_count") or 0
+        if not generation_count:
+            return "まだ生成していません"
+        
+        usage = self.store.get_usage(entry["id"])
+        models = ", ".join(f"{model} ×{count}" for model, count in usage["models"].items())
+        image_count = entry.get("image_count") or 0
+        total_cost = entry.get("total_cost") or 0.0
+        lines = [
+            f"生成 {generation_count}回 / 画像 {image_count}枚 / "
+            f"平均 {entry.get('total_latency', 0.0) / generation_count:.1f}秒 / "
+            f"推定コスト ${total_cost:.3f}（1枚あたり ${total_cost / image_count if image_count else 0.0:.4f}）",
+            f"モデル: {models or '不明'}"
+        ]
+        if usage["outputs"]:
+            lines.append(f"最新の出力: {usage['outputs'][0]}")
+        return "\n".join(lines)
+    
+    def get_selected_entry(self):
+        """選択中のエントリを取得"""
+        if self.selected_id is None:
+            return None
+        return self.get_entries([self.selected_id])[0]
+    
     def on_item_select(self, event=None):
         """ダブルクリック時の処理"""
         self.apply_selected()
     
-    def get_current_items(self):
-        """現在表示されているアイテムを取得"""
-        query = self.search_var.get().lower()
-        if not query:
-            return self.history_data["prompts"]
-        
-        filtered_items = []
-        for entry in self.history_data["prompts"]:
-            if (query in entry.get("prompt", "").lower() or 
-                query in entry.get("negative_prompt", "").lower()):
-                filtered_items.append(entry)
-        return filtered_items
-    
     def apply_selected(self, prompt_only=False):
         """選択した項目を適用"""
-        selection = self.history_tree.selection()
-        if not selection:
+        entry = self.get_selected_entry()
+        if entry is None:
             messagebox.showwarning("警告", "項目を選択してください")
             return
         
         try:
-            item_index = self.history_tree.index(selection[0])
-            current_items = self.get_current_items()
+            # プロンプトを適用
+            self.prompt_frame.set_prompt(entry.get("prompt", ""))
             
-            if 0 <= item_index < len(current_items):
-                entry = current_items[item_index]
-                
-                # プロンプトを適用
-                self.prompt_frame.set_prompt(entry.get("prompt", ""))
-                
-                if not prompt_only:
-                    # ネガティブプロンプトも適用
-                    self.prompt_frame.set_negative_prompt(entry.get("negative_prompt", ""))
-                
-                messagebox.showinfo("完了", "プロンプトを適用しました")
-                self.window.destroy()
+            if not prompt_only:
+                # ネガティブプロンプトも適用
+                self.prompt_frame.set_negative_prompt(entry.get("negative_prompt", ""))
+            
+            messagebox.showinfo("完了", "プロンプトを適用しました")
+            self.window.destroy()
         except Exception as e:
             messagebox.showerror("エラー", f"適用に失敗しました: {e}")
     
     def delete_selected(self):
         """選択した項目を削除"""
-        selection = self.history_tree.selection()
-        if not selection:
+        entry_to_delete = self.get_selected_entry()
+        if entry_to_delete is None:
             messagebox.showwarning("警告", "削除する項目を選択してください")
             return
         
@@ -281,22 +549,12 @@ class PromptHistoryWindow:
             return
         
         try:
-            item_index = self.history_tree.index(selection[0])
-            current_items = self.get_current_items()
-            
-            if 0 <= item_index < len(current_items):
-                entry_to_delete = current_items[item_index]
-                
-                # 元のリストから削除
-                for i, entry in enumerate(self.history_data["prompts"]):
-                    if (entry.get("prompt", "") == entry_to_delete.get("prompt", "") and 
-                        entry.get("negative_prompt", "") == entry_to_delete.get("negative_prompt", "")):
-                        del self.history_data["prompts"][i]
-                        break
-                
-                self.save_history()
-                self.refresh_list()
-                messagebox.showinfo("完了", "項目を削除しました")
+            self.store.delete(entry_to_delete["id"])
+            self.update_search_index("remove", entry_to_delete["id"])
+            self.row_cache.pop(entry_to_delete["id"], None)
+            self.set_selection(None)
+            self.refresh_list()
+            messagebox.showinfo("完了", "項目を削除しました")
         except Exception as e:
             messagebox.showerror("エラー", f"削除に失敗しました: {e}")
     
@@ -306,8 +564,9 @@ class PromptHistoryWindow:
             return
         
         try:
-            self.history_data = {"prompts": []}
-            self.save_history()
+            self.store.clear()
+            self.update_search_index("clear")
+            self.set_selection(None)
             self.refresh_list()
             messagebox.showinfo("完了", "全履歴を削除しました")
         except Exception as e:
@@ -2,7 +2,6 @@
 import tkinter as tk
 from tkinter import ttk
 import webbrowser
-from PIL import ImageTk
 from ..utils.image_utils import ImageDisplayManager
 
 class ResultFrame:
@@ -46,39 +45,39 @@ class ResultFrame:
         
         return result_frame
     
-    def display_images(self, image_results, saved_files):
-        """生成された画像を表示"""
-        for i, (image_data, saved_file) in enumerate(zip(image_results, saved_files)):
-            # 画像を取得してサムネイル作成
-            image_info = self.image_display_manager.create_image_display(image_data['url'], saved_file)
-            
-            if not image_info["success"]:
-                continue
-            
-            image = image_info["image"]
-            photo = image_info["photo"]
-            
-            self.generated_images.append({
-                'image': image,
-                'url': image_data['url'],
-                'filename': saved_file
-            })
-            
-            # 画像表示フレームを作成
-            img_frame = ttk.Frame(self.scrollable_frame)
-            img_frame.grid(row=i//2, column=i%2, padx=5, pady=5, sticky=(tk.W, tk.E))
-            
-            img_label = ttk.Label(img_frame, image=photo)
-            img_label.image = photo  # 参照を保持
-            img_label.grid(row=0, column=0, columnspan=2)
-            
-            size_info = f"{image.width}x{image.height}\n保存済: {saved_file}"
-            size_label = ttk.Label(img_frame, text=size_info, foreground="gray")
-            size_label.grid(row=1, column=0, columnspan=2)
-            
-            ttk.Button(img_frame, text="ブラウザで開く", 
-                      command=lambda url=image_data['url']: webbrowser.open(url)).grid(
-                          row=2, column=0, padx=2, pady=2, columnspan=2)
+    def add_image(self, url, image_info):
+        """処理済みの画像を1枚追加表示（Tkスレッドで呼ぶ）"""
+        if "photo" not in image_info:
+            image_info = self.image_display_manager.create_photo(image_info)
+        
+        width, height = image_info["size"]
+        photo = image_info["photo"]
+        saved_file = image_info["filename"]
+        
+        # 複数ジョブの結果が重ならないよう通し番号で配置
+        i = len(self.generated_images)
+        self.generated_images.append({
+            'filepath': image_info["filepath"],
+            'size': image_info["size"],
+            'url': url,
+            'filename': saved_file
+        })
+        
+        # 画像表示フレームを作成
+        img_frame = ttk.Frame(self.scrollable_frame)
+        img_frame.grid(row=i//2, column=i%2, padx=5, pady=5, sticky=(tk.W, tk.E))
+        
+        img_label = ttk.Label(img_frame, image=photo)
+        img_label.image = photo  # 参照を保持
+        img_label.grid(row=0, column=0, columnspan=2)
+        
+        size_info = f"{width}x{height}\n保存済: {saved_file}"
+        size_label = ttk.Label(img_frame, text=size_info, foreground="gray")
+        size_label.grid(row=1, column=0, columnspan=2)
+        
+        ttk.Button(img_frame, text="ブラウザで開く", 
+                  command=lambda url=url: webbrowser.open(url)).grid(
+                      row=2, column=0, padx=2, pady=2, columnspan=2)
     
     def clear_results(self):
         """結果をクリア"""
@@ -1,7 +1,6 @@
 """画像生成処理ハンドラー"""
-import threading
 import os
-from ...utils.file_utils import save_image_from_url
+from .result_processor import ResultProcessor
 
 class GenerationHandler:
     def __init__(self, main_window):
@@ -9,6 +8,13 @@ class GenerationHandler:
         self.config_manager = main_window.config_manager
         self.model_manager = main_window.model_manager
         self.image_generator = main_window.image_generator
+        self.active_jobs = 0
+        
+        # 保存・サムネイル作成を並列に行う後処理ワーカー
+        self.result_processor = ResultProcessor(
+            main_window.root,
+            max_workers=self.config_manager.get("postprocess_workers", 4)
+        )
     
     def start_generation(self):
         """画像生成を開始"""
@@ -32,121 +38,221 @@ class GenerationHandler:
                 self.main_window.update_status("エラー: 変換元の画像を選択してください")
                 return
         
-        # UI状態を変更
-        self.main_window.generate_button.config(state="disabled")
-        self.main_window.progress.start()
+        # UI状態を変更（ジョブ実行中も追加の投入を受け付ける）
+        self.active_jobs += 1
+        if self.active_jobs == 1:
+            self.main_window.progress.start()
         
         selected_model = self.main_window.model_frame.get_selected_model_endpoint()
         safety_status = "有効" if self.main_window.settings_frame.safety_checker_var.get() else "無効"
         mode_text = "画像変換中..." if self.main_window.current_mode == "image-to-image" else "画像生成中..."
-        self.main_window.update_status(f"{mode_text} (モデル: {selected_model}, 安全性フィルター: {safety_status})")
+        self.main_window.update_status(f"{mode_text} (モデル: {selected_model}, 安全性フィルター: {safety_status}, 実行中: {self.active_jobs}件)")
         
-        # 別スレッドで画像生成実行
-        thread = threading.Thread(target=self.generate_image)
-        thread.daemon = True
-        thread.start()
+        # 投入エンジンにジョブを渡す
+        self.generate_image()
     
     def generate_image(self):
-        """画像生成の実行"""
+        """画像生成ジョブの投入"""
+        mode = self.main_window.current_mode
         try:
-            prompt = self.main_window.prompt_frame.get_prompt()
-            negative_prompt = self.main_window.prompt_frame.get_negative_prompt()
             selected_model = self.main_window.model_frame.get_selected_model_endpoint()
-            generation_settings = self.main_window.settings_frame.get_generation_settings()
+            generation_params, source_image = self.build_generation_params(mode)
             
-            if self.main_window.current_mode == "text-to-image":
-                # text-to-image生成
-                image_size_params = self.main_window.size_frame.get_image_size_params()
-                
-                generation_params = self.image_generator.build_text_to_image_params(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    num_inference_steps=generation_settings["num_inference_steps"],
-                    guidance_scale=generation_settings["guidance_scale"],
-                    num_images=generation_settings["num_images"],
-                    enable_safety_checker=generation_settings["enable_safety_checker"],
-                    image_size_params=image_size_params,
-                    seed=generation_settings["seed"]
-                )
-            # image-to-image変換部分の修正
-            else:
-                # image-to-image変換
-                # 画像を取得（パスまたはPILオブジェクト）
-                image_path = self.main_window.image_input_frame.get_image_path()
-                if not image_path:
-                    # クリップボード画像の場合
-                    temp_path = self.main_window.image_input_frame.save_temp_image()
-                    upload_result = self.image_generator.upload_image_to_fal_sync(temp_path)
-                else:
-                    upload_result = self.image_generator.upload_image_to_fal_sync(image_path)
-                
-                if not upload_result["success"]:
-                    self.main_window.root.after(0, lambda: self.handle_generation_error(upload_result["error"]))
-                    return
-                
-                image_url = upload_result["url"]
-                
-                generation_params = self.image_generator.build_image_to_image_params(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    image_url=image_url,
-                    strength=generation_settings["strength"],
-                    num_inference_steps=generation_settings["num_inference_steps"],
-                    guidance_scale=generation_settings["guidance_scale"],
-                    num_images=generation_settings["num_images"],
-                    enable_safety_checker=generation_settings["enable_safety_checker"],
-                    seed=generation_settings["seed"]
-                )
+            # 履歴の生成実績用（所要時間はエンジンが計測した投入受付から結果受信まで）
+            usage = {
+                "prompt": generation_params.get("prompt", ""),
+                "negative_prompt": generation_params.get("negative_prompt", ""),
+                "model": selected_model
+            }
             
-            # 画像生成実行
-            result = self.image_generator.generate(
+            future = self.image_generator.submit(
                 api_key=self.main_window.api_frame.get_api_key(),
                 model_endpoint=selected_model,
-                generation_params=generation_params
+                generation_params=generation_params,
+                source_image=source_image,
+                meta={"mode": mode}
             )
+            future.add_done_callback(lambda f: self.on_job_done(f, mode, usage))
+        except Exception as e:
+            self.handle_generation_error(str(e))
+    
+    def resume_pending_jobs(self):
+        """前回終了時に未完了だったジョブを再開"""
+        api_key = self.main_window.api_frame.get_api_key()
+        if not api_key:
+            return
+        
+        resumed = self.image_generator.resume_jobs(api_key)
+        if not resumed:
+            return
+        
+        for job, future in resumed:
+            mode = job.get("meta", {}).get("mode", "text-to-image")
+            self.active_jobs += 1
+            future.add_done_callback(lambda f, mode=mode: self.on_job_done(f, mode))
+        
+        self.main_window.progress.start()
+        self.main_window.update_status(f"前回の未完了ジョブを再開しました: {len(resumed)}件")
+    
+    def build_generation_params(self, mode):
+        """UIの値から生成パラメータを構築 - 戻り値: (パラメータ, アップロードする入力画像パス)"""
+        prompt = self.main_window.prompt_frame.get_prompt()
+        negative_prompt = self.main_window.prompt_frame.get_negative_prompt()
+        generation_settings = self.main_window.settings_frame.get_generation_settings()
+        
+        if mode == "text-to-image":
+            # text-to-image生成
+            image_size_params = self.main_window.size_frame.get_image_size_params()
             
-            if result["success"]:
-                self.main_window.root.after(0, lambda: self.handle_generation_success(result["data"]))
-            else:
-                self.main_window.root.after(0, lambda: self.handle_generation_error(result["error"]))
-                
+            params = self.image_generator.build_text_to_image_params(
+                prompt=prompt,
+                negative_prompt=negative_prompt,
+                num_inference_steps=generation_settings["num_inference_steps"],
+                guidance_scale=generation_settings["guidance_scale"],
+                num_images=generation_settings["num_images"],
+                enable_safety_checker=generation_settings["enable_safety_checker"],
+                image_size_params=image_size_params,
+                seed=generation_settings["seed"]
+            )
+            return params, None
+        
+        # image-to-image変換
+        # 画像を取得（パスまたはPILオブジェクト）
+        image_path = self.main_window.image_input_frame.get_image_path()
+        if not image_path:
+            # クリップボード画像の場合
+            image_path = self.main_window.image_input_frame.save_temp_image()
+        
+        # image_urlはエンジンのワーカー上でアップロード後に設定される
+        params = self.image_generator.build_image_to_image_params(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            image_url=None,
+            strength=generation_settings["strength"],
+            num_inference_steps=generation_settings["num_inference_steps"],
+            guidance_scale=generation_settings["guidance_scale"],
+            num_images=generation_settings["num_images"],
+            enable_safety_checker=generation_settings["enable_safety_checker"],
+            seed=generation_settings["seed"]
+        )
+        return params, image_path
+    
+    def on_job_done(self, future, mode, usage=None):
+        """ジョブ完了時のコールバック（エンジンのスレッドから呼ばれる）"""
+        job_id = getattr(future, "job_id", None)
+        # キャッシュヒットした結果は再登録しない
+        cache_key = getattr(future, "cache_key", None)
+        try:
+            result = future.result()
         except Exception as e:
-            self.main_window.root.after(0, lambda: self.handle_generation_error(str(e)))  
+            result = {"success": False, "error": str(e)}
+        
+        if result["success"]:
+            if result.get("cached"):
+                # キャッシュから返した結果は生成実績に含めない
+                cache_key = None
+                usage = None
+            elif usage is not None:
+                usage["latency"] = result.get("latency", 0.0)
+            self.main_window.root.after(0, lambda: self.handle_generation_success(result["data"], mode, job_id, cache_key, usage))
+        else:
+            self.main_window.root.after(0, lambda: self.handle_generation_error(result["error"]))
+    
+    def finish_job(self):
+        """ジョブ1件分のUI状態を戻す"""
+        self.active_jobs = max(0, self.active_jobs - 1)
+        if self.active_jobs == 0:
+            self.main_window.progress.stop()
 
-    def handle_generation_success(self, result):
-        """画像生成成功時の処理"""
+    def handle_generation_success(self, result, mode=None, job_id=None, cache_key=None, usage=None):
+        """画像生成成功時の処理（保存・サムネイル作成はバックグラウンドで実行）"""
+        if mode is None:
+            mode = self.main_window.current_mode
+        
         try:
-            saved_files = []
-            
-            # 各画像を保存
-            for i, image_data in enumerate(result['images']):
-                filename = self.image_generator.generate_filename(i, self.main_window.current_mode)
-                filepath = os.path.join(self.image_generator.get_output_dir(), filename)
-                
-                save_result = save_image_from_url(image_data['url'], filepath)
-                if save_result["success"]:
-                    saved_files.append(filename)
-                else:
-                    self.handle_generation_error(f"画像保存エラー: {save_result['error']}")
-                    return
-            
-            # 結果表示
-            self.main_window.result_frame.display_images(result['images'], saved_files)
-            
-            # ステータス更新
-            safety_status = "フィルター有効" if self.main_window.settings_frame.safety_checker_var.get() else "フィルター無効"
-            mode_text = "変換完了" if self.main_window.current_mode == "image-to-image" else "生成完了"
-            status_msg = f"{mode_text}！ {len(result['images'])}枚自動保存 ({safety_status}): {', '.join(saved_files)}"
-            self.main_window.update_status(status_msg)
+            filepaths = []
+            images = result['images']
+            for i in range(len(images)):
+                filename = self.image_generator.generate_filename(i, mode)
+                filepaths.append(os.path.join(self.image_generator.get_output_dir(), filename))
             
+            self.result_processor.process(
+                images, filepaths,
+                on_image_ready=self.on_result_image_ready,
+                on_complete=lambda items: self.on_results_complete(items, mode, job_id, cache_key, result, usage,
+                                                                   filepaths)
+            )
         except Exception as e:
-            self.handle_generation_error(str(e))
+            self.image_generator.release_filenames(os.path.basename(path) for path in filepaths)
+            self.main_window.update_status(f"エラー: {e}")
+            self.finish_job()
+    
+    def on_result_image_ready(self, index, item):
+        """1枚処理されるごとに結果を表示（Tkスレッド）"""
+        if item["success"]:
+            self.main_window.result_frame.add_image(item["url"], item)
+        else:
+            self.main_window.update_status(f"エラー: {item['error']}")
+    
+    def on_results_complete(self, items, mode, job_id, cache_key=None, result=None, usage=None,
+                            filepaths=()):
+        """全画像の処理完了時の処理（Tkスレッド）"""
+        try:
+            # 保存済み・失敗したファイル名の予約を解除
+            self.image_generator.release_filenames(os.path.basename(path) for path in filepaths)
+            
+            saved_files = [item["filename"] for item in items if item and item["success"]]
+            mode_text = "変換完了" if mode == "image-to-image" else "生成完了"
+            if len(saved_files) < len(items):
+                # 一部の保存に失敗（上限回数までは次回起動時に保存し直す）
+                errors = [item["error"] for item in items if item and not item["success"]]
+                will_retry = self.image_generator.mark_job_save_failed(job_id, errors[0] if errors else "保存失敗")
+                retry_text = "次回起動時に再保存します" if will_retry else "再保存は行いません"
+                self.main_window.update_status(
+                    f"{mode_text}（一部保存失敗）: {len(saved_files)}/{len(items)}枚保存、{retry_text}: "
+                    f"{', '.join(saved_files)}"
+                )
+            else:
+                # 保存完了をジャーナルに記録
+                self.image_generator.mark_job_done(job_id)
+                
+                # シード固定の結果をキャッシュに登録
+                if cache_key and result is not None:
+                    self.image_generator.store_cached_result(cache_key, [item["filepath"] for item in items], result)
+                
+                # 履歴エントリの生成実績を更新
+                if usage is not None:
+                    self.record_usage(usage, [item["filepath"] for item in items])
+                
+                # ステータス更新
+                safety_status = "フィルター有効" if self.main_window.settings_frame.safety_checker_var.get() else "フィルター無効"
+                status_msg = f"{mode_text}！ {len(saved_files)}枚自動保存 ({safety_status}): {', '.join(saved_files)}"
+                self.main_window.update_status(status_msg)
         finally:
-            self.main_window.progress.stop()
-            self.main_window.generate_button.config(state="normal")
+            self.finish_job()
+    
+    def record_usage(self, usage, filepaths):
+        """生成実績（モデル・所要時間・出力ファイル・推定コスト）を履歴に記録"""
+        try:
+            cost = self.model_manager.estimate_cost(
+                usage["model"], len(filepaths),
+                overrides=self.config_manager.get("estimated_cost_per_image", {})
+            )
+            self.main_window.prompt_frame.prompt_history.record_generation(
+                usage["prompt"], usage["negative_prompt"],
+                model=usage["model"], latency=usage["latency"],
+                output_files=filepaths, cost=cost,
+                # プロンプトの自動保存が無効なら既存エントリにだけ加算する
+                create=self.config_manager.get("auto_save_prompts", True)
+            )
+        except Exception as e:
+            print(f"生成実績の記録エラー: {e}")
+    
+    def shutdown(self):
+        """後処理ワーカーを停止"""
+        self.result_processor.shutdown()
     
     def handle_generation_error(self, error_message):
         """画像生成エラー時の処理"""
-        self.main_window.progress.stop()
-        self.main_window.generate_button.config(state="normal")
+        self.finish_job()
         self.main_window.update_status(f"エラー: {error_message}")
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""生成結果の後処理（ダウンロード・保存・サムネイル作成）をバックグラウンドで並列実行"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+from pathlib import Path
+from ...utils.file_utils import save_result_image
+from ..utils.image_utils import ImageDisplayManager
+
+class ResultProcessor:
+    def __init__(self, root, max_workers=4, thumbnail_size=(200, 200)):
+        self.root = root
+        self.image_display_manager = ImageDisplayManager(thumbnail_size)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ResultProcessor")
+        # 停止後はTkへコールバックを登録しない（終了処理中のrootを触らないため）
+        self._closed = False
+        self._schedule_lock = threading.Lock()
+    
+    def process(self, images, filepaths, on_image_ready, on_complete):
+        """各画像をワーカーで処理し、完了した順にTkスレッドへ渡す
+        
+        on_image_ready(index, item) は画像ごと、on_complete(items) は全画像の処理後に
+        Tkスレッド上で呼ばれる。itemはImageDisplayManager.prepare_thumbnailの結果に
+        url・index を加えたもの（PhotoImageはTkスレッド側で作成する）。
+        """
+        items = [None] * len(images)
+        remaining = [len(images)]
+        lock = threading.Lock()
+        
+        if not images:
+            self.schedule(on_complete, items)
+            return
+        
+        def done(future, index):
+            try:
+                item = future.result()
+            except Exception as e:
+                item = {"success": False, "error": str(e), "index": index}
+            items[index] = item
+            self.schedule(on_image_ready, index, item)
+            
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                self.schedule(on_complete, items)
+        
+        for index, (image_data, filepath) in enumerate(zip(images, filepaths)):
+            future = self.executor.submit(self.process_image, index, image_data, filepath)
+            future.add_done_callback(lambda f, index=index: done(f, index))
+    
+    def schedule(self, callback, *args):
+        """Tkスレッドで実行するよう登録（停止後は何もしない）"""
+        with self._schedule_lock:
+            if self._closed:
+                return
+            self.root.after(0, callback, *args)
+    
+    def process_image(self, index, image_data, filepath):
+        """1枚分のダウンロード（キャッシュ結果はコピー）・保存・サムネイル作成"""
+        save_result = save_result_image(image_data, filepath)
+        if not save_result["success"]:
+            return {"success": False, "error": f"画像保存エラー: {save_result['error']}", "index": index,
+                    "url": image_data.get("url")}
+        
+        saved_path = save_result["filepath"]
+        # キャッシュ結果はURLを持たないためローカルファイルを開く
+        url = image_data.get("url") or Path(os.path.abspath(saved_path)).as_uri()
+        item = self.image_display_manager.prepare_thumbnail(saved_path, os.path.basename(saved_path))
+        item.update({"index": index, "url": url})
+        return item
+    
+    def shutdown(self):
+        """ワーカーを停止（未着手の処理は破棄し、以後の結果はTkへ渡さない）"""
+        with self._schedule_lock:
+            self._closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
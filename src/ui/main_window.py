@@ -58,6 +58,12 @@ class MainWindow:
         # 現在のモードを保存
         self.config_manager.set("last_mode", self.current_mode)
         
+        # 未保存の設定を書き出して書き込みスレッドを停止
+        self.config_manager.close()
+        
+        # 後処理ワーカーを停止
+        self.generation_handler.shutdown()
+        
         # アプリケーション終了
         self.root.quit()
         self.root.destroy()
@@ -1,33 +1,43 @@
 """画像表示・処理関連のユーティリティ"""
-import requests
-from PIL import Image, ImageTk
-from io import BytesIO
+from PIL import ImageTk
+from ...utils.file_utils import create_thumbnail_from_file
 
 class ImageDisplayManager:
     def __init__(self, thumbnail_size=(200, 200)):
         self.thumbnail_size = thumbnail_size
     
-    def create_image_display(self, image_url, filename):
-        """URLから画像を取得してサムネイル表示用に処理"""
+    def prepare_thumbnail(self, filepath, filename):
+        """保存済みファイルからサムネイルを作成（ワーカースレッドで実行可能、再ダウンロードしない）"""
         try:
-            response = requests.get(image_url)
-            response.raise_for_status()
-            
-            image = Image.open(BytesIO(response.content))
-            
-            # サムネイル作成
-            thumbnail = image.copy()
-            thumbnail.thumbnail(self.thumbnail_size, Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(thumbnail)
-            
+            thumbnail, size = create_thumbnail_from_file(filepath, self.thumbnail_size)
             return {
                 "success": True,
-                "image": image,
-                "photo": photo,
+                "filepath": filepath,
+                "size": size,
+                "thumbnail": thumbnail,
                 "filename": filename
             }
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+    
+    def create_photo(self, image_info):
+        """サムネイルからPhotoImageを作成（Tkスレッドで実行）"""
+        image_info["photo"] = ImageTk.PhotoImage(image_info["thumbnail"])
+        return image_info
+    
+    def create_image_display(self, filepath, filename):
+        """保存済みファイルからサムネイル表示用に処理"""
+        image_info = self.prepare_thumbnail(filepath, filename)
+        if not image_info["success"]:
+            return image_info
+        
+        try:
+            return self.create_photo(image_info)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
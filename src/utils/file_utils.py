@@ -1,23 +1,126 @@
 """ファイル操作関連のユーティリティ"""
 import os
-import requests
+import hashlib
+import shutil
+import tempfile
 from PIL import Image
-from io import BytesIO
+from .http_client import get_download_client
+from .image_cache import fetched_image_cache
 
-def save_image_from_url(url, filepath):
-    """URLから画像をダウンロードして保存"""
+# Content-Typeから保存時の拡張子を決定
+CONTENT_TYPE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif"
+}
+
+def match_extension(filepath, content_type):
+    """サーバーが返した形式に合わせて拡張子を補正（再エンコードしないため）"""
+    if not content_type:
+        return filepath
+
+    extension = CONTENT_TYPE_EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+    if not extension:
+        return filepath
+
+    base, current = os.path.splitext(filepath)
+    if current.lower() == extension or (extension == ".jpg" and current.lower() == ".jpeg"):
+        return filepath
+    return base + extension
+
+def save_image_from_url(url, filepath, chunk_size=64 * 1024, decode=False):
+    """URLから画像をストリーミングで保存（デコード・再エンコードなし）
+
+    一時ファイルに書き込みながらSHA-256を計算し、完了後にリネームする。
+    拡張子はContent-Typeに合わせて補正されるため、実際の保存先は戻り値のfilepathを使う。
+    取得済みのURLは共有キャッシュのローカルファイルを使い、再ダウンロードしない。
+    """
+    cached = fetched_image_cache.get(url)
+    if cached:
+        return save_image_from_cache(url, cached, filepath, decode)
+
+    temp_path = None
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        image = Image.open(BytesIO(response.content))
-        image.save(filepath)
-        return {"success": True, "image": image}
+        with get_download_client().stream(url, chunk_size) as (headers, chunks):
+            filepath = match_extension(filepath, headers.get("Content-Type"))
+
+            directory = os.path.dirname(os.path.abspath(filepath))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".download_", suffix=".part")
+
+            sha256 = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+        os.replace(temp_path, filepath)
+        temp_path = None
+
+        fetched_image_cache.put(url, filepath, sha256.hexdigest(), size)
+        result = {"success": True, "filepath": filepath, "sha256": sha256.hexdigest(), "size": size}
+        if decode:
+            result["image"] = Image.open(filepath)
+        return result
     except Exception as e:
         return {"success": False, "error": str(e)}
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def copy_file_atomic(source, filepath):
+    """一時ファイル経由でコピー（ハードリンク共有先を上書きしないよう新しいファイルに置き換える）"""
+    if os.path.exists(filepath) and os.path.samefile(source, filepath):
+        return
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".copy_", suffix=".part")
+    os.close(fd)
+    try:
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, filepath)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def save_image_from_cache(url, cached, filepath, decode=False):
+    """キャッシュ済みファイルを保存先にコピー"""
+    try:
+        filepath = os.path.splitext(filepath)[0] + os.path.splitext(cached["filepath"])[1]
+        copy_file_atomic(cached["filepath"], filepath)
+
+        result = {"success": True, "filepath": filepath, "sha256": cached["sha256"], "size": cached["size"]}
+        if decode:
+            result["image"] = Image.open(filepath)
+        return result
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def save_result_image(image_data, filepath):
+    """生成結果の画像を保存（結果キャッシュのローカルファイルはコピー、それ以外はダウンロード）"""
+    if image_data.get("path"):
+        try:
+            filepath = os.path.splitext(filepath)[0] + os.path.splitext(image_data["path"])[1]
+            copy_file_atomic(image_data["path"], filepath)
+            return {"success": True, "filepath": filepath, "size": os.path.getsize(filepath)}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    return save_image_from_url(image_data["url"], filepath)
 
 def create_thumbnail(image, size=(200, 200)):
     """サムネイル画像を作成"""
     thumbnail = image.copy()
     thumbnail.thumbnail(size, Image.Resampling.LANCZOS)
-    return thumbnail
\ No newline at end of file
+    return thumbnail
+
+def create_thumbnail_from_file(filepath, size=(200, 200)):
+    """保存済みファイルからサムネイルを作成 - 戻り値: (サムネイル, 元画像サイズ)"""
+    with Image.open(filepath) as image:
+        original_size = image.size
+        # JPEGはデコード時に縮小して読み込む
+        image.draft("RGB", size)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        return image.copy(), original_size
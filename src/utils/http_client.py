@@ -0,0 +1,125 @@
+"""画像ダウンロード用の共有HTTPクライアント（接続プール・タイムアウト・再試行・同時接続数制限）"""
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP/2はhttpxとh2がある場合のみ使用
+try:
+    import httpx
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+# 再試行するステータスコード
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class DownloadClient:
+    def __init__(self, max_concurrency=8, pool_size=16, timeout=(5.0, 60.0), retries=3,
+                 backoff_factor=0.5, http2=None):
+        # timeoutは (接続, 読み取り) 秒
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        # http2がNoneなら利用可能な場合のみ有効化
+        self.http2 = HTTP2_AVAILABLE if http2 is None else (http2 and HTTP2_AVAILABLE)
+        if self.http2:
+            self.client = httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                follow_redirects=True
+            )
+            self.session = None
+        else:
+            retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                          allowed_methods=frozenset(["GET", "HEAD"]), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            self.session = requests.Session()
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.client = None
+
+    @contextmanager
+    def stream(self, url, chunk_size=64 * 1024):
+        """レスポンスをストリーミングで取得 - (ヘッダー, チャンクのイテレータ) を返すコンテキスト"""
+        with self._semaphore:
+            if self.client is not None:
+                with self._open_httpx(url) as response:
+                    yield response.headers, response.iter_bytes(chunk_size)
+            else:
+                with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    yield response.headers, response.iter_content(chunk_size)
+
+    @contextmanager
+    def _open_httpx(self, url):
+        """httpxで接続（接続エラー・再試行対象のステータスはバックオフして再試行）"""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.send(self.client.build_request("GET", url), stream=True)
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff_factor * (2 ** attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                response.close()
+                time.sleep(self.backoff_factor * (2 ** attempt))
+                continue
+
+            # 本文の読み取り中のエラーは再試行しない（呼び出し側で一時ファイルを破棄する）
+            try:
+                response.raise_for_status()
+                yield response
+            finally:
+                response.close()
+            return
+
+    def get(self, url):
+        """レスポンス本文をまとめて取得"""
+        with self.stream(url) as (_, chunks):
+            return b"".join(chunks)
+
+    def close(self):
+        """接続プールを閉じる"""
+        if self.client is not None:
+            self.client.close()
+        if self.session is not None:
+            self.session.close()
+
+_download_client = None
+_download_client_lock = threading.Lock()
+
+def configure_download_client(**options):
+    """共有クライアントを設定値で作り直す（起動時に1回呼ぶ）"""
+    global _download_client
+    with _download_client_lock:
+        if _download_client is not None:
+            _download_client.close()
+        _download_client = DownloadClient(**options)
+        return _download_client
+
+def get_download_client():
+    """共有クライアントを取得（未設定なら既定値で作成）"""
+    global _download_client
+    with _download_client_lock:
+        if _download_client is None:
+            _download_client = DownloadClient()
+        return _download_client
+
+def download_options_from_config(config):
+    """設定（ConfigManagerまたは辞書）からクライアントの引数を作成"""
+    return {
+        "max_concurrency": config.get("download_max_concurrency", 8),
+        "timeout": (config.get("download_connect_timeout", 5.0), config.get("download_read_timeout", 60.0)),
+        "retries": config.get("download_retries", 3),
+        "http2": config.get("download_http2", None)
+    }
@@ -0,0 +1,42 @@
+"""取得済み画像の共有キャッシュ（URLで参照）"""
+import os
+import threading
+from collections import OrderedDict
+
+class FetchedImageCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._by_url = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, url, filepath, sha256, size):
+        """ダウンロード済みファイルを登録"""
+        entry = {"filepath": filepath, "sha256": sha256, "size": size}
+        with self._lock:
+            self._by_url[url] = entry
+            self._by_url.move_to_end(url)
+
+            # 古いエントリから破棄（ファイル自体は削除しない）
+            while len(self._by_url) > self.max_entries:
+                self._by_url.popitem(last=False)
+        return entry
+
+    def get(self, url):
+        """URLに対応するローカルファイル情報を取得（ファイルが消えていればNone）"""
+        with self._lock:
+            entry = self._by_url.get(url)
+            if entry is None:
+                return None
+            if not os.path.exists(entry["filepath"]):
+                del self._by_url[url]
+                return None
+            self._by_url.move_to_end(url)
+            return dict(entry)
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._by_url.clear()
+
+# 保存・サムネイル・表示で共有するインスタンス
+fetched_image_cache = FetchedImageCache()
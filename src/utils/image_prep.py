@@ -0,0 +1,63 @@
+"""img2img入力画像の前処理（モデルの作業解像度への縮小と再圧縮）"""
+import math
+from io import BytesIO
+from PIL import Image, ImageOps
+
+FORMAT_CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+def has_alpha(image):
+    """透過チャンネルを持つかどうか"""
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+def prepare_input_image(data, max_pixels=None, image_format="JPEG", quality=90):
+    """入力画像を縮小・再圧縮 - 戻り値: (バイト列, Content-Type, 拡張子)
+
+    max_pixelsを超える画像はアスペクト比を保って縮小する。縮小不要で既に
+    JPEG/WEBPの場合は元のバイト列をそのまま返す（再圧縮による劣化を避ける）。
+    JPEG指定でも透過画像はPNGで保存する。
+    """
+    image = Image.open(BytesIO(data))
+    original_format = image.format
+    width, height = image.size
+    needs_resize = bool(max_pixels) and width * height > max_pixels
+
+    if not needs_resize and original_format in ("JPEG", "WEBP"):
+        return data, FORMAT_CONTENT_TYPES[original_format], FORMAT_EXTENSIONS[original_format]
+
+    if needs_resize:
+        scale = math.sqrt(max_pixels / (width * height))
+        # JPEGはデコード時点で縮小して読み込む
+        image.draft("RGB", (int(width * scale), int(height * scale)))
+
+    # EXIFの回転情報を反映
+    image = ImageOps.exif_transpose(image)
+
+    if needs_resize:
+        width, height = image.size
+        scale = math.sqrt(max_pixels / (width * height))
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    image_format = image_format.upper()
+    if image_format == "JPG":
+        image_format = "JPEG"
+    if image_format not in FORMAT_CONTENT_TYPES:
+        image_format = "JPEG"
+    if image_format == "JPEG" and has_alpha(image):
+        image_format = "PNG"
+
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality)
+    encoded = buffer.getvalue()
+
+    # 縮小なしで再圧縮しても小さくならない場合は元データを使う
+    if not needs_resize and len(encoded) >= len(data) and original_format in FORMAT_CONTENT_TYPES:
+        return data, FORMAT_CONTENT_TYPES[original_format], FORMAT_EXTENSIONS[original_format]
+    return encoded, FORMAT_CONTENT_TYPES[image_format], FORMAT_EXTENSIONS[image_format]
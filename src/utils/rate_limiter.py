@@ -0,0 +1,56 @@
+"""APIリクエストのレート制限（トークンバケット）"""
+import multiprocessing
+import threading
+import time
+
+class RateLimiter:
+    def __init__(self, rate_per_second, burst=None):
+        self.rate_per_second = rate_per_second
+        self.capacity = burst if burst is not None else max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンが得られるまで待機（rate_per_secondが0以下なら無制限）"""
+        if self.rate_per_second <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
+
+class SharedRateLimiter(RateLimiter):
+    """複数プロセスで共有するトークンバケット（子プロセスの生成時に引数として渡す）"""
+    def __init__(self, rate_per_second, burst=None, context=None):
+        context = context or multiprocessing.get_context()
+        self.rate_per_second = rate_per_second
+        self.capacity = burst if burst is not None else max(1.0, rate_per_second)
+        # [残りトークン, 最終更新時刻] を共有メモリに保持（time.monotonicはプロセス間で共通）
+        self._state = context.Array('d', [self.capacity, time.monotonic()])
+
+    def acquire(self):
+        """トークンが得られるまで待機（rate_per_secondが0以下なら無制限）"""
+        if self.rate_per_second <= 0:
+            return
+
+        while True:
+            with self._state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate_per_second)
+                self._state[1] = now
+
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / self.rate_per_second
+            time.sleep(wait)
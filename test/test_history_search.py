@@ -0,0 +1,111 @@
+"""プロンプト履歴検索インデックスのテスト"""
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core import history_search
+from src.core.history_search import HistorySearchIndex, date_tokens, edit_distance, tokenize
+
+NOW = 1_800_000_000.0
+
+def make_entry(entry_id, prompt, negative_prompt="", timestamp="2026-10-01T12:00:00", use_count=1):
+    return {"id": entry_id, "prompt": prompt, "negative_prompt": negative_prompt,
+            "timestamp": timestamp, "use_count": use_count}
+
+def test_tokenize():
+    """英数字は単語、日本語は2文字ずつ、全角は半角に正規化"""
+    assert tokenize("Cyberpunk ALLEY, 8K") == ["cyberpunk", "alley", "8k"]
+    assert tokenize("ＮＥＯＮ") == ["neon"]
+    assert tokenize("路地裏") == ["路地", "地裏"]
+    assert tokenize("3月の夜") == ["3月", "の夜"]
+    assert tokenize("") == []
+
+def test_date_tokens():
+    """日時から月名・月・年の語を作成"""
+    tokens = date_tokens("2026-03-14T10:00:00")
+    assert {"march", "mar", "3月", "2026", "2026年", "14日"} <= set(tokens)
+    assert date_tokens("invalid") == []
+    assert date_tokens(None) == []
+
+def test_edit_distance():
+    """置換・挿入・削除・隣接文字の入れ替えを1回と数える"""
+    assert edit_distance("alley", "alley") == 0
+    assert edit_distance("alley", "aley") == 1
+    assert edit_distance("alley", "allay") == 1
+    assert edit_distance("alley", "laley") == 1
+    assert edit_distance("alley", "aly") == 2
+    assert edit_distance("alley", "street") == 2
+
+def test_search_prefers_exact_match():
+    """完全一致 > 前方一致 > あいまい一致"""
+    index = HistorySearchIndex()
+    index.build([
+        make_entry(1, "neon signs"),
+        make_entry(2, "neons everywhere"),
+        make_entry(3, "noen glow"),
+    ])
+    assert index.search("neon", now=NOW)[:2] == [1, 2]
+    assert index.search("nean", now=NOW) == [1]
+    assert sorted(index.search("neo", now=NOW)) == [1, 2]
+
+def test_search_bm25_ranking():
+    """珍しい語・短いプロンプト・多くの検索語に一致するものが上位"""
+    index = HistorySearchIndex()
+    index.build([
+        make_entry(1, "cyberpunk alley rain"),
+        make_entry(2, "cyberpunk city"),
+        make_entry(3, "cyberpunk " + " ".join(f"filler{i}" for i in range(30))),
+        make_entry(4, "quiet alley cat"),
+    ])
+    results = index.search("cyberpunk alley", now=NOW)
+    assert results[0] == 1
+    assert results.index(2) < results.index(3)
+
+def test_search_recency_and_usage_boost():
+    """関連度が同じ場合は新しいもの・よく使うものが上位"""
+    index = HistorySearchIndex()
+    index.build([
+        make_entry(1, "dragon castle", timestamp="2020-01-01T00:00:00"),
+        make_entry(2, "dragon castle", timestamp="2027-01-14T00:00:00"),
+        make_entry(3, "dragon castle", timestamp="2020-01-01T00:00:00", use_count=5),
+    ])
+    results = index.search("dragon castle", now=NOW)
+    assert results[0] == 2
+    assert results.index(3) < results.index(1)
+
+def test_search_date_terms_boost_content_matches():
+    """日付の語は内容で一致したエントリの順位だけを上げる"""
+    index = HistorySearchIndex()
+    index.build([
+        make_entry(1, "cyberpunk alley", timestamp="2026-03-14T10:00:00"),
+        make_entry(2, "cyberpunk alley", timestamp="2026-05-14T10:00:00"),
+        make_entry(3, "forest lake", timestamp="2026-03-20T10:00:00"),
+    ])
+    assert index.search("that cyberpunk alley prompt from March", now=NOW) == [1, 2]
+    # 日付だけの検索は日付で探す
+    assert sorted(index.search("march", now=NOW)) == [1, 3]
+
+def test_incremental_updates():
+    """追加・置き換え・削除がインデックスに反映される"""
+    index = HistorySearchIndex()
+    index.build([make_entry(1, "red car")])
+    index.add(make_entry(2, "blue car"))
+    assert sorted(index.search("car", now=NOW)) == [1, 2]
+
+    index.add(make_entry(1, "red bicycle"))
+    assert index.search("car", now=NOW) == [2]
+
+    index.remove(2)
+    assert index.search("car", now=NOW) == []
+    assert "car" not in index.postings
+    assert len(index) == 1
+
+def test_candidate_limit(monkeypatch):
+    """よく出る語の検索は上限件数の新しいエントリに絞る"""
+    monkeypatch.setattr(history_search, "MAX_SCORED_CANDIDATES", 10)
+    index = HistorySearchIndex()
+    index.build([make_entry(i, "masterpiece portrait") for i in range(100)])
+    results = index.search("masterpiece", now=NOW)
+    assert sorted(results) == list(range(90, 100))
@@ -0,0 +1,122 @@
+"""ジョブジャーナルの再生・圧縮と未完了ジョブの再開のテスト"""
+import json
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import fal_client
+import pytest
+
+from src.core.image_generator import ImageGenerator
+from src.core.job_journal import JobJournal
+
+class FakeHandle:
+    def __init__(self, client, request_id):
+        self.client = client
+        self.request_id = request_id
+
+    async def status(self):
+        return fal_client.Completed(logs=None, metrics={})
+
+    async def get(self):
+        return {"images": [{"url": f"https://example.com/{self.request_id}.png"}]}
+
+class FakeAsyncClient:
+    """fal_client.AsyncClientと同じくsubmit・get_handleともにコルーチン"""
+    def __init__(self):
+        self.submitted = []
+        self.handles = []
+
+    async def submit(self, application, arguments):
+        self.submitted.append((application, arguments))
+        return FakeHandle(self, f"new{len(self.submitted)}")
+
+    async def get_handle(self, application, request_id):
+        self.handles.append((application, request_id))
+        return FakeHandle(self, request_id)
+
+@pytest.fixture
+def journal_file(tmp_path):
+    return str(tmp_path / "jobs.jsonl")
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def test_replay_restores_latest_state(journal_file):
+    """追記された状態遷移を再生して最新状態を復元（書きかけ行は無視）"""
+    journal = JobJournal(journal_file)
+    job_id = journal.create_job("fal-ai/flux/dev", {"prompt": "cat"})
+    journal.mark_submitted(job_id, "req1")
+    with open(journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"job_id": "broken", "sta')
+
+    jobs = JobJournal(journal_file).get_unfinished_jobs()
+    assert len(jobs) == 1
+    assert jobs[0]["state"] == "submitted"
+    assert jobs[0]["request_id"] == "req1"
+    assert jobs[0]["params"] == {"prompt": "cat"}
+
+def test_compact_drops_finished_jobs(journal_file):
+    """起動時の圧縮で完了・失敗したジョブを除き、1ジョブ1行にまとめる"""
+    journal = JobJournal(journal_file)
+    done_id = journal.create_job("ep", {})
+    journal.mark_done(done_id)
+    failed_id = journal.create_job("ep", {})
+    journal.mark_failed(failed_id, "error")
+    open_id = journal.create_job("ep", {})
+    journal.mark_submitted(open_id, "req1")
+
+    JobJournal(journal_file)
+    lines = read_lines(journal_file)
+    assert [line["job_id"] for line in lines] == [open_id]
+    assert lines[0]["state"] == "submitted"
+    assert not os.path.exists(f"{journal_file}.tmp")
+
+def test_save_attempts_are_capped(journal_file):
+    """保存失敗は上限回数で再開対象から外す"""
+    journal = JobJournal(journal_file)
+    job_id = journal.create_job("ep", {})
+    journal.mark_completed(job_id, {"images": []})
+    assert journal.mark_save_failed(job_id, "disk full", max_attempts=2)
+    assert not journal.mark_save_failed(job_id, "disk full", max_attempts=2)
+    assert journal.get_unfinished_jobs() == []
+
+def test_resume_jobs_by_state(tmp_path, journal_file):
+    """queuedは再投入、submittedは再接続、completedは保存済みの結果を返す"""
+    journal = JobJournal(journal_file)
+    queued_id = journal.create_job("fal-ai/flux/dev", {"prompt": "queued"})
+    submitted_id = journal.create_job("fal-ai/flux/dev", {"prompt": "submitted"})
+    journal.mark_submitted(submitted_id, "req-running")
+    completed_id = journal.create_job("fal-ai/flux/dev", {"prompt": "completed"})
+    journal.mark_submitted(completed_id, "req-done")
+    journal.mark_completed(completed_id, {"images": [{"url": "https://example.com/done.png"}]})
+
+    client = FakeAsyncClient()
+    generator = ImageGenerator(output_dir=str(tmp_path / "out"), poll_interval=0.01,
+                               journal_file=journal_file, client_factory=lambda api_key: client)
+    try:
+        resumed = {job["job_id"]: future for job, future in generator.resume_jobs("key")}
+        results = {job_id: future.result(timeout=5) for job_id, future in resumed.items()}
+    finally:
+        generator.shutdown()
+
+    assert set(results) == {queued_id, submitted_id, completed_id}
+    assert all(result["success"] for result in results.values())
+
+    # queued: 新たに投入し直す
+    assert client.submitted == [("fal-ai/flux/dev", {"prompt": "queued"})]
+    assert results[queued_id]["request_id"] == "new1"
+
+    # submitted: 既存のrequest_idに再接続する（再投入しない）
+    assert client.handles == [("fal-ai/flux/dev", "req-running")]
+    assert results[submitted_id]["data"]["images"][0]["url"] == "https://example.com/req-running.png"
+
+    # completed: APIを呼ばずにジャーナルの結果を使う
+    assert results[completed_id]["data"]["images"][0]["url"] == "https://example.com/done.png"
+
+    # 結果取得後はいずれもcompletedとして記録（保存完了まで再開対象に残る）
+    states = {job["job_id"]: job["state"] for job in generator.journal.get_unfinished_jobs()}
+    assert states == {queued_id: "completed", submitted_id: "completed", completed_id: "completed"}